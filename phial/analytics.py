@@ -0,0 +1,274 @@
+"""Analytics of the state to state graph of a deterministic net.
+
+A deterministic TPM gives every state exactly one successor, so the
+state graph is a functional graph.  Store it as a successor array
+(succ[code] = code of next state) instead of a dense 2^N x 2^N matrix
+and everything below is found in time (and memory) linear in the number
+of states:
+
+  attractors (cycles) and their lengths, the basin (and size) of each
+  attractor, transient depth of each state (steps to reach its
+  attractor), Garden-of-Eden (unreachable) states, and number of weakly
+  connected components (= number of attractors).
+
+ChunkedStateGraph finds the attractors and unreachable states of TPMs
+too big for that (e.g. memory-mapped from disk), a chunk at a time.
+"""
+# External packages
+import numpy as np
+
+
+class FunctionalGraph():
+    """State graph with one successor per state.
+    InstanceVars: succ, on_cycle, attractor, depth, cycles, garden_of_eden
+
+    >>> fg = FunctionalGraph([1, 2, 1, 3, 3])
+    >>> fg.cycles
+    [[1, 2], [3]]
+    >>> fg.attractor.tolist(), fg.depth.tolist()
+    ([0, 0, 0, 1, 1], [1, 0, 0, 0, 1])
+    >>> fg.basin_sizes.tolist(), fg.garden_of_eden.tolist()
+    ([3, 2], [0, 4])
+    """
+    def __init__(self, succ):
+        """succ:: succ[code] is code of the state that follows state CODE"""
+        succ = np.asarray(succ, dtype=np.int64)
+        num = len(succ)
+        self.succ = succ
+        indegree = np.bincount(succ, minlength=num)
+        self.garden_of_eden = np.flatnonzero(indegree == 0)
+
+        # Peel off states not on a cycle, one layer of in-degree 0 at a time.
+        # Every layer's successors are in a later layer or on a cycle.
+        remaining = indegree.copy()
+        layers = []
+        frontier = self.garden_of_eden
+        while len(frontier) > 0:
+            layers.append(frontier)
+            nxt,counts = np.unique(succ[frontier], return_counts=True)
+            remaining[nxt] -= counts
+            frontier = nxt[remaining[nxt] == 0]
+        self.on_cycle = np.ones(num, dtype=bool)
+        for layer in layers:
+            self.on_cycle[layer] = False
+
+        # Walk each cycle once.
+        self.attractor = np.full(num, -1, dtype=np.int64)
+        self.cycles = []
+        for start in np.flatnonzero(self.on_cycle).tolist():
+            if self.attractor[start] >= 0:
+                continue
+            cycle = [start]
+            state = int(succ[start])
+            while state != start:
+                cycle.append(state)
+                state = int(succ[state])
+            self.attractor[cycle] = len(self.cycles)
+            self.cycles.append(cycle)
+
+        # Transients take the attractor of their successor, nearest first.
+        self.depth = np.zeros(num, dtype=np.int64)
+        for layer in reversed(layers):
+            self.depth[layer] = self.depth[succ[layer]] + 1
+            self.attractor[layer] = self.attractor[succ[layer]]
+
+    def __len__(self):
+        return len(self.succ)
+
+    @property
+    def num_attractors(self):
+        return len(self.cycles)
+
+    @property
+    def num_components(self):
+        """Weakly connected components. Each has exactly one cycle."""
+        return len(self.cycles)
+
+    @property
+    def cycle_lengths(self):
+        return np.array([len(c) for c in self.cycles], dtype=np.int64)
+
+    @property
+    def basin_sizes(self):
+        """Number of states (including the cycle) flowing to each attractor."""
+        return np.bincount(self.attractor, minlength=len(self.cycles))
+
+    def basin(self, attractor):
+        """Codes of states in the basin of attractor number ATTRACTOR."""
+        return np.flatnonzero(self.attractor == attractor)
+
+    def edges(self):
+        """(code, successor code) of every state."""
+        return zip(range(len(self.succ)), self.succ.tolist())
+
+    def summary(self):
+        return dict(
+            num_states = len(self),
+            num_attractors = self.num_attractors,
+            cycle_lengths = self.cycle_lengths.tolist(),
+            basin_sizes = self.basin_sizes.tolist(),
+            max_transient_depth = int(self.depth.max(initial=0)),
+            num_garden_of_eden = len(self.garden_of_eden),
+        )
+
+
+class ChunkedStateGraph():
+    """Same questions as FunctionalGraph for TPMs too big to hold the
+    successor array (and its helpers) in memory; e.g. a np.memmap TPM of
+    a 20+ node net.  The TPM is read CHUNK_SIZE states at a time.  Only a
+    couple of bool arrays (one byte per state) and the attractor number
+    of each state are kept in memory.
+
+    Finding the states on cycles takes one pass over the TPM per step of
+    the longest transient.
+    InstanceVars: tpm, spns, chunk_size
+
+    >>> tpm = np.array([[1],[2],[1],[3],[3]])   # one node with 5 states
+    >>> csg = ChunkedStateGraph(tpm, [5], chunk_size=2)
+    >>> csg.cycles, csg.garden_of_eden.tolist()
+    ([[1, 2], [3]], [0, 4])
+    >>> csg.sample(4, seed=0)['attractor'].tolist()
+    [1, 1, 0, 0]
+    >>> csg.cycle_attractor.tolist(), csg.cycle_lengths.tolist()
+    ([-1, 0, 0, 1, -1], [2, 1])
+    """
+    def __init__(self, tpm, spns, chunk_size=2**16):
+        """tpm:: State-by-Node TPM (ndarray or np.memmap); row is state code
+        spns:: States Per Node for each node"""
+        spns = np.asarray(spns, dtype=np.int64)
+        self.tpm = tpm
+        self.spns = spns
+        self.chunk_size = chunk_size
+        self.weights = np.cumprod(np.concatenate(([1], spns[:-1]))).astype(np.int64)
+        self._reachable = None
+        self._on_cycle = None
+        self._attractor = None
+        self._cycles = None
+
+    def __len__(self):
+        return len(self.tpm)
+
+    def successors(self, codes):
+        """State codes that follow each of CODES (ndarray or slice)."""
+        return self.tpm[codes].astype(np.int64) @ self.weights
+
+    def iter_chunks(self):
+        """GENERATES: (start, succ) where succ[i] follows state start+i."""
+        for start in range(0, len(self), self.chunk_size):
+            stop = min(start + self.chunk_size, len(self))
+            yield start, self.successors(slice(start, stop))
+
+    @property
+    def reachable(self):
+        """Bool array; True for states that have a predecessor."""
+        if self._reachable is None:
+            reached = np.zeros(len(self), dtype=bool)
+            for start,succ in self.iter_chunks():
+                reached[succ] = True
+            self._reachable = reached
+        return self._reachable
+
+    @property
+    def garden_of_eden(self):
+        return np.flatnonzero(~self.reachable)
+
+    @property
+    def on_cycle(self):
+        """Bool array; True for states on an attractor.  The image of the
+        reachable states, taken until it stops shrinking."""
+        if self._on_cycle is None:
+            image = self.reachable
+            while True:
+                nxt = np.zeros(len(self), dtype=bool)
+                for start in range(0, len(self), self.chunk_size):
+                    stop = min(start + self.chunk_size, len(self))
+                    codes = start + np.flatnonzero(image[start:stop])
+                    if len(codes) > 0:
+                        nxt[self.successors(codes)] = True
+                if np.array_equal(nxt, image):
+                    break
+                image = nxt
+            self._on_cycle = image
+        return self._on_cycle
+
+    @property
+    def cycle_attractor(self):
+        """Int array; attractor number of each state on a cycle, -1 for
+        transient states (unlike FunctionalGraph.attractor).  Attractors are numbered in order of their
+        smallest state code.  Found by pointer jumping over the states on
+        cycles, so it takes log2(longest cycle) vectorized passes."""
+        if self._attractor is None:
+            on = np.flatnonzero(self.on_cycle)
+            dtype = np.int32 if len(self) < 2**31 else np.int64
+            # jump[i]: index (into ON) of the state 2**k steps after on[i]
+            jump = np.empty(len(on), dtype=dtype)
+            for start in range(0, len(on), self.chunk_size):
+                chunk = on[start:start + self.chunk_size]
+                jump[start:start + len(chunk)] = np.searchsorted(
+                    on, self.successors(chunk))
+            # low[i]: smallest index in the 2**k states from on[i]
+            low = np.arange(len(on), dtype=dtype)
+            while True:
+                nxt = np.minimum(low, low[jump])
+                if np.array_equal(nxt, low):
+                    break
+                low = nxt
+                jump = jump[jump]
+            del jump
+            attractor = np.full(len(self), -1, dtype=dtype)
+            attractor[on] = np.unique(low, return_inverse=True)[1]
+            self._attractor = attractor
+        return self._attractor
+
+    @property
+    def cycles(self):
+        """List of attractors; each a list of state codes in transition
+        order (starting at its smallest code).  This walks every state on
+        a cycle in Python; sample() and summary() do not need it."""
+        if self._cycles is None:
+            on = np.flatnonzero(self.on_cycle)
+            starts = on[np.unique(self.cycle_attractor[on], return_index=True)[1]]
+            self._cycles = []
+            for start in starts.tolist():
+                cycle = [start]
+                state = int(self.successors([start])[0])
+                while state != start:
+                    cycle.append(state)
+                    state = int(self.successors([state])[0])
+                self._cycles.append(cycle)
+        return self._cycles
+
+    @property
+    def num_attractors(self):
+        return int(self.cycle_attractor.max(initial=-1)) + 1
+
+    @property
+    def cycle_lengths(self):
+        attractor = self.cycle_attractor
+        return np.bincount(attractor[attractor >= 0],
+                           minlength=self.num_attractors).astype(np.int64)
+
+    def sample(self, num, seed=None):
+        """Run NUM random states to their attractors.  Attractor counts
+        estimate the relative basin sizes.
+        RETURN: dict of ndarrays; code, attractor, depth (transient steps)"""
+        rng = np.random.default_rng(seed)
+        codes = rng.integers(len(self), size=num)
+        on_cycle = self.on_cycle
+        state = codes.copy()
+        depth = np.zeros(num, dtype=np.int64)
+        moving = np.flatnonzero(~on_cycle[state])
+        while len(moving) > 0:
+            state[moving] = self.successors(state[moving])
+            depth[moving] += 1
+            moving = moving[~on_cycle[state[moving]]]
+        attractor = self.cycle_attractor[state].astype(np.int64)
+        return dict(code=codes, attractor=attractor, depth=depth)
+
+    def summary(self):
+        return dict(
+            num_states = len(self),
+            num_attractors = self.num_attractors,
+            cycle_lengths = self.cycle_lengths.tolist(),
+            num_garden_of_eden = int((~self.reachable).sum()),
+        )
@@ -0,0 +1,337 @@
+#! /usr/bin/env python
+"""Benchmarks of the hot paths of phial on standard nets.
+
+Time (and peak memory) of each benchmark is saved to a JSON baseline.
+Run it before and after a change and compare:
+
+  python -m phial.benchmark run baseline.json
+  python -m phial.benchmark run new.json
+  python -m phial.benchmark compare baseline.json new.json
+
+Compare exits with status 1 if any benchmark got slower (or used more
+memory) than the baseline by more than --threshold.
+
+Times are the best of REPEAT runs (each after a fresh setup). Peak
+memory is from tracemalloc in one more run, so its overhead is not in
+the times.  Import times are of a new python process importing the
+module (so include python startup; see import/sys).  Benchmarks that
+take minutes (phi of the hi-fi net) only run
+with --slow.
+"""
+# Python standard library
+import argparse
+import datetime
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+# External packages
+import numpy as np
+# Local packages
+import phial.toolbox as tb
+import phial.node_functions as nf
+import phial.gen_funcs as gf
+from phial.experiment import Experiment
+
+
+##############################################################################
+### Standard nets
+###
+
+def suite1_net():
+    """3-node bidirectional OR, AND, XOR (examples/suite1.json)"""
+    net = tb.Net(edges=[('A','B'), ('A','C'), ('B','A'),
+                        ('B','C'), ('C','A'), ('C','B')],
+                 title='suite1')
+    for label,func in dict(A='OR', B='AND', C='XOR').items():
+        net.get_node(label).func = nf.funcLUT[func]
+    net.tpm_array = net.calc_tpm_array()
+    return net
+
+def xor_net(N=4):
+    """Ring of N XOR nodes, each with both neighbors as inputs."""
+    edges = ([(i,(i+1) % N) for i in range(N)]
+             + [((i+1) % N,i) for i in range(N)])
+    return tb.Net(edges=edges, func=nf.XOR_func, title=f'xor{N}')
+
+def hifi_net():
+    """6-node net with high phi (notebooks/hi-fi.ipynb, from Larissa's 2015
+    paper).  Ring with self loops; each node XORs two of its inputs."""
+    N = 6
+    edges = [(i,j) for i in range(N) for j in range(N)
+             if (i - j) % N in (0, 1, N-1)]
+    net = tb.Net(edges=edges, title='hi-fi')
+    # Truth tables over inputs in ID order (see BoolFunc)
+    luts = ([[0,1,0,1,1,0,1,0]]
+            + [[0,0,1,1,1,1,0,0]] * 4
+            + [[0,1,1,0,0,1,1,0]])
+    for node,lut in zip(net.nodes, luts):
+        node.func = gf.BoolFunc.from_lut(lut)
+    net.tpm_array = net.calc_tpm_array()
+    return net
+
+def random_net(N, seed=0, k=2, tpm=True):
+    """Net of N nodes, each with K random inputs and a random func.
+    tpm:: Calculate the TPM now (else only when used; big nets can't)"""
+    rng = random.Random(seed)
+    edges = [(i,j) for j in range(N) for i in rng.sample(range(N), k)]
+    net = tb.Net(edges=edges, title=f'random{N}')
+    for node in net.nodes:
+        node.func = nf.funcLUT[rng.choice(['AND','OR','XOR','MJ','NAND','NOR'])]
+    if tpm:
+        net.tpm_array = net.calc_tpm_array()
+    return net
+
+def first_state(net):
+    """A reachable state of net (to calculate phi of)."""
+    return int(net.out_state_codes[0])
+
+
+##############################################################################
+### Benchmarks
+###
+
+class Benchmark():
+    """One thing to time.  SETUP is called (untimed) before each run and
+    its return value is passed to RUN."""
+    def __init__(self, name, run, setup=lambda: None, repeat=None,
+                 slow=False):
+        """repeat:: Most timed runs to do (for slow ones).
+        slow:: Takes minutes. Only run when asked for."""
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeat = repeat
+        self.slow = slow
+
+    def measure(self, repeat=5):
+        """RETURN: dict of best and mean seconds and peak bytes of RUN."""
+        repeat = min(repeat, self.repeat or repeat)
+        times = []
+        for r in range(repeat):
+            arg = self.setup()
+            start = time.perf_counter()
+            self.run(arg)
+            times.append(time.perf_counter() - start)
+        arg = self.setup()
+        tracemalloc.start()
+        try:
+            self.run(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return dict(seconds=min(times),
+                    mean_seconds=statistics.mean(times),
+                    repeat=repeat,
+                    peak_bytes=peak)
+
+def _fresh(net):
+    """Drop what Net caches between calls so every run does the work."""
+    net.clear_phi_caches()
+    net._analytics = None
+    net._successors = None
+    return net
+
+def _phi(make_net):
+    def setup():
+        net = _fresh(make_net())
+        return net, first_state(net)
+    return setup
+
+def _change_one_func(net):
+    """A mechanism sweep step; only one TPM column is recalculated."""
+    node = net.nodes[0]
+    node.func = nf.XOR_func if node.func is not nf.XOR_func else nf.AND_func
+    return net.tpm_array
+
+def _import(module):
+    """Import MODULE in a new python process (as a CLI or worker does)."""
+    subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+
+def benchmarks():
+    """RETURN: list of all Benchmark"""
+    benches = []
+    # Startup of a bare python process is the baseline for these.
+    for module in ['sys', 'phial.toolbox', 'phial.experiment', 'pyphi']:
+        benches.append(Benchmark(f'import/{module}',
+                                 lambda a, module=module: _import(module)))
+    for N in (8, 12, 16):
+        benches.append(Benchmark(f'all_states/N={N}',
+                                 lambda a, N=N: tb.all_states(N)))
+    for N in range(3, 11):
+        edges = list(random_net(N).graph.edges)
+        # Net construction including its TPM (which is calculated lazily)
+        benches.append(Benchmark(f'net_init/random{N}',
+                                 lambda a, edges=edges:
+                                 tb.Net(edges=edges).tpm_array))
+    for name,make in [('suite1', suite1_net), ('hifi', hifi_net),
+                      ('random10', lambda: random_net(10)),
+                      ('random16', lambda: random_net(16))]:
+        benches.extend([
+            Benchmark(f'calc_tpm_array/{name}',
+                      lambda net: net.calc_tpm_array(), setup=make),
+            Benchmark(f'out_states/{name}',
+                      lambda net: net.out_states, setup=make),
+            Benchmark(f'analytics/{name}',
+                      lambda net: net.analytics.summary(),
+                      setup=lambda make=make: _fresh(make())),
+            ])
+    benches.append(Benchmark('update_tpm/random16',
+                             _change_one_func,
+                             setup=lambda: random_net(16)))
+    benches.append(Benchmark('calc_tpm/random10',
+                             lambda net: net.calc_tpm(),
+                             setup=lambda: random_net(10)))
+    for name,N in [('random16', 16), ('random10000', 10**4)]:
+        make = lambda N=N: random_net(N, tpm=False)
+        benches.extend([
+            Benchmark(f'simulate/{name}',
+                      lambda net: net.simulate(1000, steps=10, seed=0),
+                      setup=make),
+            Benchmark(f'find_attractors/{name}',
+                      lambda net: net.find_attractors(1000, max_steps=100,
+                                                      seed=0),
+                      setup=make),
+            ])
+    phinets = [('suite1', suite1_net), ('xor4', xor_net)]
+    phinets += [(f'random{N}', lambda N=N: random_net(N)) for N in (3,4,5)]
+    for name,make in phinets:
+        benches.append(Benchmark(f'phi/{name}',
+                                 lambda a: a[0].phi(a[1]),
+                                 setup=_phi(make)))
+    benches.append(Benchmark('phi/hifi',
+                             lambda net: net.phi('000011'),
+                             setup=lambda: _fresh(hifi_net()),
+                             repeat=1, slow=True))
+    for name,make,repeat in [('suite1', suite1_net, None),
+                             ('xor4', xor_net, 2)]:
+        benches.append(Benchmark(
+            f'experiment_run/{name}',
+            lambda exp: exp.run(),
+            setup=lambda make=make: Experiment([], net=_fresh(make())),
+            repeat=repeat))
+    return benches
+
+def run_benchmarks(only=None, repeat=5, slow=False, verbose=False):
+    """Run the benchmarks with names matching regular expression ONLY
+    (default all). Slow ones only if SLOW.
+    RETURN: dict with meta (about this machine and run) and results
+    (d[benchmarkName] = measurement)"""
+    results = dict()
+    for bench in benchmarks():
+        if only is not None and not re.search(only, bench.name):
+            continue
+        if bench.slow and not slow:
+            continue
+        results[bench.name] = bench.measure(repeat=repeat)
+        if verbose:
+            res = results[bench.name]
+            print(f"{bench.name:28} {res['seconds']:10.5f} sec "
+                  f"{res['peak_bytes']/2**20:9.2f} MiB", flush=True)
+    import pyphi # only for its version; importing phial.benchmark is cheap
+    meta = dict(date=datetime.datetime.now().isoformat(timespec='seconds'),
+                python=platform.python_version(),
+                numpy=np.__version__,
+                pyphi=pyphi.__version__,
+                platform=platform.platform(),
+                repeat=repeat,
+                slow=slow)
+    return dict(meta=meta, results=results)
+
+def compare(baseline, new, threshold=1.25, min_seconds=0.001,
+            min_bytes=64*1024):
+    """Compare results of two run_benchmarks().  A benchmark regressed if
+    its time (or peak memory) grew by a factor of more than THRESHOLD.
+    Differences in time under MIN_SECONDS, and in peak memory under
+    MIN_BYTES, are noise.
+    RETURN: list of (name, oldSeconds, newSeconds, timeRatio, memRatio,
+    regressed) for benchmarks in both.
+
+    >>> old = dict(results={'a': dict(seconds=1.0, peak_bytes=100)})
+    >>> new = dict(results={'a': dict(seconds=2.0, peak_bytes=100)})
+    >>> compare(old, new)
+    [('a', 1.0, 2.0, 2.0, 1.0, True)]
+    >>> new = dict(results={'a': dict(seconds=1.0, peak_bytes=1000)})
+    >>> compare(old, new)[0][-1], compare(old, new, min_bytes=0)[0][-1]
+    (False, True)
+    """
+    rows = []
+    for name,res in new['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = res['seconds'] / max(old['seconds'], 1e-9)
+        memratio = res['peak_bytes'] / max(old['peak_bytes'], 1)
+        regressed = ((ratio > threshold
+                      and res['seconds'] - old['seconds'] > min_seconds)
+                     or (memratio > threshold
+                         and res['peak_bytes'] - old['peak_bytes'] > min_bytes))
+        rows.append((name, old['seconds'], res['seconds'],
+                     round(ratio, 3), round(memratio, 3), regressed))
+    return rows
+
+##############################################################################
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time phial hot paths and compare with a baseline.',
+        epilog=('EXAMPLE: %(prog)s run new.json; '
+                '%(prog)s compare baseline.json new.json')
+        )
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='Run benchmarks; save results as JSON.')
+    run.add_argument('outfile', help='JSON file to write results to.')
+    run.add_argument('--repeat', type=int, default=5,
+                     help='Number of timed runs of each benchmark.')
+    run.add_argument('--only',
+                     help='Regular expression; run benchmarks it matches.')
+    run.add_argument('--slow', action='store_true',
+                     help='Also run benchmarks that take minutes.')
+    cmp = sub.add_parser('compare', help='Compare results with a baseline.')
+    cmp.add_argument('baseline', help='JSON results to compare against.')
+    cmp.add_argument('new', help='JSON results of the change.')
+    cmp.add_argument('--threshold', type=float, default=1.25,
+                     help=('Flag benchmarks slower (or bigger) than '
+                           'baseline by more than this factor.'))
+    cmp.add_argument('--min_seconds', type=float, default=0.001,
+                     help='Ignore time differences less than this.')
+    cmp.add_argument('--min_bytes', type=int, default=64*1024,
+                     help='Ignore peak memory differences less than this.')
+    sub.add_parser('list', help='List benchmark names.')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for bench in benchmarks():
+            print(bench.name + (' (slow)' if bench.slow else ''))
+    elif args.command == 'run':
+        res = run_benchmarks(only=args.only, repeat=args.repeat,
+                             slow=args.slow, verbose=True)
+        with open(args.outfile, 'w') as f:
+            json.dump(res, f, indent=2)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare(baseline, new, threshold=args.threshold,
+                       min_seconds=args.min_seconds,
+                       min_bytes=args.min_bytes)
+        print(f"{'benchmark':28} {'baseline':>10} {'new':>10} "
+              f"{'time':>7} {'memory':>7}")
+        for name,old,secs,ratio,memratio,regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f'{name:28} {old:10.5f} {secs:10.5f} '
+                  f'{ratio:6.2f}x {memratio:6.2f}x{flag}')
+        missing = set(baseline['results']) - set(new['results'])
+        if missing:
+            print(f"Not in {args.new}: {', '.join(sorted(missing))}")
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
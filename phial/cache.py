@@ -0,0 +1,152 @@
+"""Persistent (on disk) cache of phi results.
+
+Results are keyed by the content of what was computed: a hash of the
+TPM, the connectivity matrix, the state and the pyphi config options that
+change the value of phi.  So an unchanged net never has to be computed
+twice; no matter what notebook or CLI run computed it first.
+
+The cache lives in an SQLite file in a directory given on creation, or by
+the PHIAL_CACHE_DIR environment variable (default: ~/.cache/phial).
+"""
+# Python standard library
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+# External packages
+import numpy as np
+
+
+# pyphi config options that change the value of phi. (Others only change
+# how it is computed.)
+PHI_CONFIG_KEYS = [
+    'ASSUME_CUTS_CANNOT_CREATE_NEW_CONCEPTS',
+    'CUT_ONE_APPROXIMATION',
+    'MEASURE',
+    'PARTITION_TYPE',
+    'PICK_SMALLEST_PURVIEW',
+    'PRECISION',
+    'SINGLE_MICRO_NODES_WITH_SELFLOOPS_HAVE_PHI',
+    'SYSTEM_CUTS',
+    'USE_SMALL_PHI_DIFFERENCE_FOR_CES_DISTANCE',
+    'VALIDATE_CONDITIONAL_INDEPENDENCE',
+]
+
+def default_directory():
+    return pathlib.Path(os.environ.get('PHIAL_CACHE_DIR', '~/.cache/phial')
+                        ).expanduser()
+
+def net_key(tpm, cm):
+    """Hash (hexstr) of everything about a net (and pyphi config) that
+    determines phi.  Combine with a state using state_key().
+    tpm:: State-by-Node TPM (2D ndarray)
+    cm:: connectivity matrix (2D ndarray)
+    """
+    import pyphi
+    config = dict((k, getattr(pyphi.config, k, None)) for k in PHI_CONFIG_KEYS)
+    h = hashlib.sha256()
+    for arr in (np.asarray(tpm, dtype=np.float64), np.asarray(cm, dtype=np.float64)):
+        h.update(repr(arr.shape).encode())
+        h.update(np.ascontiguousarray(arr).tobytes())
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def state_key(netkey, state):
+    """Cache key of STATE (sequence of node states) in net with NETKEY."""
+    return netkey + ':' + ','.join(str(int(s)) for s in state)
+
+
+class PhiCache():
+    """Content addressed phi results stored in SQLite. When the stored data
+    grows over max_bytes, the least recently used results are evicted.
+    Can be used from any thread (e.g. by Experiment.aiter_run()).
+    InstanceVars: path, max_bytes, hits, misses
+    """
+
+    filename = 'phi_cache.sqlite'
+
+    def __init__(self, directory=None, max_bytes=100*2**20):
+        directory = (default_directory() if directory is None
+                     else pathlib.Path(directory).expanduser())
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / PhiCache.filename
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # One connection shared by threads; the lock serializes its use.
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS phi ('
+                        'key TEXT PRIMARY KEY, '
+                        'phi REAL, '
+                        'elapsed_seconds REAL, '
+                        'last_used REAL)')
+        self.db.commit()
+
+    def get(self, key):
+        """RETURN: cached phi for KEY, or None if not in cache."""
+        with self.lock:
+            row = self.db.execute('SELECT phi FROM phi WHERE key=?',
+                                  (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute('UPDATE phi SET last_used=? WHERE key=?',
+                            (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    def put(self, key, phi, elapsed_seconds=None):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO phi VALUES (?,?,?,?)',
+                            (key, float(phi), elapsed_seconds, time.time()))
+            self.db.commit()
+            if self.size > self.max_bytes:
+                self.evict()
+
+    @property
+    def size(self):
+        """Bytes used by stored data (free pages not counted)."""
+        with self.lock:
+            pages = self.db.execute('PRAGMA page_count').fetchone()[0]
+            free = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+            page_size = self.db.execute('PRAGMA page_size').fetchone()[0]
+        return (pages - free) * page_size
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM phi').fetchone()[0]
+
+    def evict(self, fraction=0.25):
+        """Remove least recently used results until size is under max_bytes.
+        Removes at least FRACTION of results each pass so that we don't
+        evict on every put()."""
+        with self.lock:
+            while self.size > self.max_bytes and len(self) > 0:
+                num = max(1, int(len(self) * fraction))
+                self.db.execute('DELETE FROM phi WHERE key IN '
+                                '(SELECT key FROM phi ORDER BY last_used '
+                                'LIMIT ?)', (num,))
+                self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM phi')
+            self.db.commit()
+            self.db.execute('VACUUM')
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    entries=len(self),
+                    bytes=self.size,
+                    path=str(self.path))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,260 @@
+"""Canonical form of a Net; the same for every relabeling of its nodes.
+
+Two nets that only differ by the labels (or IDs) of their nodes have the
+same phi for corresponding states.  The canonical form covers the graph,
+the States Per Node, and the truth table of each node (as a function of
+its predecessors, taken from the TPM).  Its hash lets sweeps and
+experiments compute each such class of nets only once (see DedupIndex).
+
+Canonical ordering of nodes is found by color refinement plus
+individualization (the approach used by graph isomorphism tools like
+nauty) with pruning by the automorphisms found along the way. Fine for
+the size of net we can compute phi for.
+"""
+# Python standard library
+from collections import Counter, namedtuple
+import hashlib
+# External packages
+import numpy as np
+# Local packages
+import phial.toolbox as tb
+import phial.trace as tr
+
+
+# hash:: hexstr identifying the class of isomorphic nets
+# order:: order[k] is the position (in net.nodes) of canonical node k
+# automorphisms:: generators of the automorphism group, each a tuple
+#    mapping node position to node position.
+Canon = namedtuple('Canon', ['hash', 'order', 'automorphisms'])
+
+def truth_tables(net, check=True):
+    """Truth table of each node as a function of its predecessors (in ID
+    order, packed as in pack_states) read from the TPM of net.
+    check:: Raise ValueError if TPM depends on nodes that are not
+       predecessors (then the tables don't fully describe the TPM)."""
+    tpm = net.tpm_array
+    spns = net.spns
+    weights = tb.radix_weights(spns, backwards=True)
+    allstates = tb.state_matrix(spns) if check else None
+    tables = []
+    for i,node in enumerate(net.nodes):
+        preds = net.predecessor_indices(node)
+        inputs = tb.state_matrix(spns[preds], backwards=False)
+        table = tpm[inputs @ weights[preds], i].astype(np.int64)
+        if check and not (table[net.packed_inputs(node, allstates)]
+                          == tpm[:,i]).all():
+            raise ValueError(f'TPM of node {node.label} depends on nodes '
+                             'that are not its predecessors')
+        tables.append(table)
+    return tables
+
+
+class _Structure():
+    """What the canonical form is made of; indexed by node position."""
+    def __init__(self, net):
+        self.n = len(net.nodes)
+        self.spns = [int(s) for s in net.spns]
+        self.preds = [net.predecessor_indices(node) for node in net.nodes]
+        self.succs = [[] for i in range(self.n)]
+        for v,preds in enumerate(self.preds):
+            for u in preds:
+                self.succs[u].append(v)
+        self.tables = truth_tables(net)
+
+    def initial_colors(self):
+        return _rank([(self.spns[v],
+                       v in self.preds[v],
+                       len(self.preds[v]),
+                       len(self.succs[v]),
+                       tuple(sorted(Counter(self.tables[v].tolist()).items())))
+                      for v in range(self.n)])
+
+    def refine(self, colors):
+        """Split colors until nodes of the same color have the same number
+        of predecessors (and successors) of each color."""
+        while True:
+            new = _rank([(colors[v],
+                          tuple(sorted(colors[u] for u in self.preds[v])),
+                          tuple(sorted(colors[w] for w in self.succs[v])))
+                         for v in range(self.n)])
+            if len(set(new)) == len(set(colors)):
+                return new
+            colors = new
+
+    def encoding(self, order):
+        """Complete description of the net with nodes in ORDER."""
+        pos = [0]*self.n
+        for k,v in enumerate(order):
+            pos[v] = k
+        tables = []
+        for v in order:
+            preds = self.preds[v]
+            shape = [self.spns[u] for u in preds]
+            axes = np.argsort([pos[u] for u in preds])
+            tables.append(tuple(self.tables[v].reshape(shape).transpose(axes)
+                                .ravel().tolist()))
+        return (tuple(self.spns[v] for v in order),
+                tuple(sorted((pos[u],pos[v])
+                             for v in range(self.n) for u in self.preds[v])),
+                tuple(tables))
+
+def _rank(signatures):
+    """Replace each signature with its rank among the distinct signatures."""
+    ranks = dict((sig,i) for i,sig in enumerate(sorted(set(signatures))))
+    return [ranks[sig] for sig in signatures]
+
+def _orbits(n, perms):
+    """RETURN: list with a representative node for each node; the same for
+    nodes in the same orbit of the group generated by PERMS."""
+    parent = list(range(n))
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+    for perm in perms:
+        for v in range(n):
+            a,b = find(v), find(perm[v])
+            if a != b:
+                parent[max(a,b)] = min(a,b)
+    return [find(v) for v in range(n)]
+
+def canonical_form(net):
+    """RETURN: Canon(hash, order, automorphisms) of NET."""
+    with tr.span('canonical_form'):
+        return _canonical_form(net)
+
+def _canonical_form(net):
+    st = _Structure(net)
+    best = dict(enc=None, order=None)
+    autos = []
+
+    def search(colors, prefix):
+        colors = st.refine(colors)
+        cells = dict()
+        for v,c in enumerate(colors):
+            cells.setdefault(c, []).append(v)
+        split = [c for c in sorted(cells) if len(cells[c]) > 1]
+        if not split:
+            order = sorted(range(st.n), key=lambda v: colors[v])
+            enc = st.encoding(order)
+            if best['enc'] is None or enc < best['enc']:
+                best['enc'], best['order'] = enc, order
+            elif enc == best['enc']:
+                perm = [0]*st.n
+                for a,b in zip(best['order'], order):
+                    perm[a] = b
+                autos.append(tuple(perm))
+            return
+        tried = set()
+        for v in cells[split[0]]:
+            # Skip v if an automorphism fixing prefix maps it to a tried node
+            fixing = [a for a in autos if all(a[p] == p for p in prefix)]
+            orbit = _orbits(st.n, fixing)
+            if any(orbit[v] == orbit[t] for t in tried):
+                continue
+            tried.add(v)
+            individual = [2*c + 1 for c in colors]
+            individual[v] = 2*colors[v]
+            search(individual, prefix + [v])
+
+    search(st.initial_colors(), [])
+    digest = hashlib.sha256(repr(best['enc']).encode()).hexdigest()
+    return Canon(digest, best['order'], autos)
+
+def canonical_hash(net):
+    """Hash (hexstr) that is the same for all relabelings of net.
+
+    >>> a = tb.Net(edges=[(0,1),(1,2),(2,0)])
+    >>> canonical_hash(a) == canonical_hash(tb.Net(edges=[(2,1),(1,0),(0,2)]))
+    True
+    >>> canonical_hash(a) == canonical_hash(tb.Net(edges=[(0,1),(1,2),(2,2)]))
+    False
+    """
+    return canonical_form(net).hash
+
+def state_orbits(codes, spns, automorphisms):
+    """Orbits of states under the group generated by AUTOMORPHISMS (node
+    permutations, see Canon). Every image of a state in CODES must also be
+    in CODES; true of reachable states (or all states).
+    RETURN: dict[code] = smallest code in its orbit
+
+    >>> net = tb.Net(edges=[(0,1),(1,2),(2,0)])
+    >>> codes = range(8)
+    >>> state_orbits(codes, net.spns, canonical_form(net).automorphisms)
+    {0: 0, 1: 1, 2: 1, 3: 3, 4: 1, 5: 3, 6: 3, 7: 7}
+    """
+    codes = [int(c) for c in codes]
+    parent = dict((c,c) for c in codes)
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+    states = tb.decode_states(codes, spns)
+    for perm in automorphisms:
+        # Node v's state moves to node perm[v]
+        inverse = np.argsort(perm)
+        images = tb.encode_states(states[:,inverse], spns).tolist()
+        for c,image in zip(codes, images):
+            a,b = find(c), find(image)
+            if a != b:
+                parent[max(a,b)] = min(a,b)
+    return dict((c,find(c)) for c in codes)
+
+def to_canonical_codes(codes, spns, order):
+    """State codes of net (with SPNS) to state codes of its canonical form."""
+    states = tb.decode_states(codes, spns)[:,order]
+    return tb.encode_states(states, np.asarray(spns)[order])
+
+def from_canonical_codes(codes, spns, order):
+    """Inverse of to_canonical_codes()."""
+    spns = np.asarray(spns)
+    cstates = tb.decode_states(codes, spns[order])
+    states = np.empty_like(cstates)
+    states[:,order] = cstates
+    return tb.encode_states(states, spns)
+
+
+class DedupIndex():
+    """Values (e.g. phi results) of nets, shared by all nets isomorphic to
+    the one they were added for.  Values are dict[stateCode] = value; they
+    are translated to the state codes of whatever net they are looked up
+    for.
+    """
+    def __init__(self):
+        self.index = dict() # d[hash] = d[canonicalStateCode] = value
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, net):
+        return canonical_hash(net) in self.index
+
+    def add(self, net, values, canon=None):
+        """VALUES: dict[stateCode] = value of the states of NET"""
+        canon = canon or canonical_form(net)
+        codes = list(values)
+        ccodes = to_canonical_codes(codes, net.spns, canon.order).tolist()
+        self.index[canon.hash] = dict((cc,values[c])
+                                      for c,cc in zip(codes, ccodes))
+        return canon.hash
+
+    def get(self, net, canon=None):
+        """RETURN: dict[stateCode] = value for the state codes of NET or None
+        if no isomorphic net has been added."""
+        canon = canon or canonical_form(net)
+        if canon.hash not in self.index:
+            self.misses += 1
+            return None
+        self.hits += 1
+        cvalues = self.index[canon.hash]
+        ccodes = list(cvalues)
+        codes = from_canonical_codes(ccodes, net.spns, canon.order).tolist()
+        return dict((c,cvalues[cc]) for c,cc in zip(codes, ccodes))
+
+    @property
+    def stats(self):
+        return dict(classes=len(self), hits=self.hits, misses=self.misses)
@@ -5,55 +5,76 @@ import argparse
 import logging
 from datetime import datetime
 import json
+import csv
+import os
 import platform
+import time
+import threading
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 # External packages
-import pandas as pd
-import matplotlib.pyplot as plt
 import itertools as it
 import numpy as np
 # Local packages
 import phial.toolbox as tb
 import phial.node_functions as nf
-from phial.utils import tic,toc,Timer
+import phial.cache as pc
+import phial.canon as cn
+import phial.gen_funcs as gf
+import phial.trace as tr
+from phial.utils import tic,toc,Timer,drop_partial_line
 
 
-class AllPerms():  # modified from earlier AllPerms to remove redundant rows from LUT
+class AllPerms(gf.FuncSpace):  # modified from earlier AllPerms to remove redundant rows from LUT
     # create a node set with all possible binary responses
+    # Functions are made on demand; see gf.FuncSpace for len, slicing, etc.
     def __init__(self, N, name=''):
         # N is the number of inputs to the node
-        self.N = N
         self.permutations = 2**(N+1)
+        super().__init__(N)
 
         self.indices = set([sum(k) for k in it.product([0,1], repeat=N)])  
         self.name = name
-        LUT = []
-        for k in range(self.permutations):
-            nn = [int(i) for i in list('{0:016b}'.format(k))]
-            nn.reverse()
-            LUT.append([nn[k] for k in self.indices])
-        self.lut = np.array(LUT).T
+        # Number of inputs on, for each packed input state
+        self._ones = np.array([bin(k).count('1') for k in range(2**N)], dtype=int)
+
+    @property
+    def num_all(self):
+        return self.permutations
+
+    @property
+    def lut(self):
+        # lut[numInputsOn, n] is bit numInputsOn of n
+        return (np.arange(self.permutations)[None,:]
+                >> np.array(sorted(self.indices))[:,None]) & 1
+
+    def func(self, n):
+        # n is the node-function index: bit k is output when k inputs are on
+        if not 0 <= n < self.permutations:
+            raise IndexError(f'Func {n} not in {self.permutations} of AllPerms')
+        return gf.BoolFunc.from_lut((n >> self._ones) & 1,
+                                    name=f'{self.name}AllPerms{self.N}_{n}')
+
+    def rank(self, func):
+        n = 0
+        for inputs in it.product([0,1], repeat=self.N):
+            n |= int(func(list(inputs))) << sum(inputs)
+        return n
 
     def __call__(self, n):
-        # n is the node-function index
-        def node(inputs):
-            # inputs is a binary tuple of node inputs
-            if (len(inputs) != self.N):
-                txt = 'this function group requires a tuple with {} inputs: {} supplied'.\
-                format(self.N, len(inputs))
-                raise ValueError(txt)
-            return self.lut[sum(inputs), n]
-        return node
+        return self.func(n)
 
 
 def gen_truth_funcs(map_node_argcnt): 
     """map_node_argcnt: d[nodeLabel] = numArgs
-    RETURN: d[nodeLabel] = [func1(inputs), func2(inputs), ... ]
+    RETURN: d[nodeLabel] = AllPerms (lazy sequence of func1(inputs), ...)
     """
     objs = [AllPerms(k) for k in set(map_node_argcnt.values())]
     
     funcs = dict()
     for j in objs:
-        funcs[j.N] = [j(k) for k in range(j.permutations)]
+        funcs[j.N] = j
     out = dict()
     for j, k in map_node_argcnt.items():
         out[j] = funcs[k]
@@ -61,6 +82,138 @@ def gen_truth_funcs(map_node_argcnt):
     return out
 
 
+# The pyphi Networks of a worker process.  Each is built by the worker the
+# first time it gets a state of that net and reused for every later state.
+_worker_nets = None     # [(tpm, cm, node_labels), ...] from _init_worker()
+                        # tpm is a dict if the net's TPM is memory-mapped
+_worker_networks = dict() # d[net_index] = (pyphi Network, tb.RepertoireCache)
+
+def _init_worker(nets):
+    global _worker_nets
+    import pyphi
+    # Workers already use all the cores; don't let pyphi start more processes.
+    pyphi.config.PARALLEL_CONCEPT_EVALUATION = False
+    pyphi.config.PARALLEL_CUT_EVALUATION = False
+    pyphi.config.PARALLEL_COMPLEX_EVALUATION = False
+    _worker_nets = nets
+    _worker_networks.clear()
+
+def _worker_phi(net_index, state):
+    """RETURN: (phi, elapsed_seconds, cpu_seconds, max_rss_kb) of STATE in
+    the net.  max_rss_kb is the peak memory of this worker so far."""
+    if net_index not in _worker_networks:
+        tpm, cm, node_labels = _worker_nets[net_index]
+        import pyphi.network
+        if isinstance(tpm, dict):
+            tpm = np.memmap(mode='r', **tpm)
+        _worker_networks[net_index] = (
+            pyphi.network.Network(tpm.astype(np.float64), cm=cm,
+                                  node_labels=node_labels),
+            tb.RepertoireCache())
+    network, repertoires = _worker_networks[net_index]
+    timer = Timer()
+    timer.tic
+    cpu0 = time.process_time()
+    phi = tb.network_phi(network, state, repertoires)
+    return phi, timer.toc, time.process_time() - cpu0, tr.max_rss_kb()
+
+def _tpm_spec(tpm):
+    """TPM to send to workers. Memory-mapped TPMs are sent as where they
+    are in their file so each worker maps it instead of getting a copy."""
+    filename = getattr(tpm, 'filename', None)
+    if filename is None:
+        return tpm
+    return dict(filename=str(filename), offset=tpm.offset, dtype=tpm.dtype,
+                shape=tpm.shape, order='C' if tpm.flags.c_contiguous else 'F')
+
+def calculate_jobs(nets, jobs, workers=None, deadline=None):
+    """Calculate phi for every job. All jobs share one pool of workers.
+    nets:: list of Net
+    jobs:: list of (key, net_index, state) where state is a list of the
+       state of each node of nets[net_index].  Key is anything; it is
+       passed back with the result.
+    workers:: Number of processes. Default (None or 1) runs serially.
+    deadline:: time.perf_counter() value to give up at.
+    GENERATES: (key, phi, elapsed_seconds, cpu_seconds) as each completes."""
+    if workers is not None and workers > 1:
+        specs = [(_tpm_spec(net.tpm_array), net.cm, net.node_labels)
+                 for net in nets]
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker,
+                                   initargs=(specs,))
+        futures = dict((pool.submit(_worker_phi, i, state), key)
+                       for key,i,state in jobs)
+        finished = False
+        try:
+            timeout = (None if deadline is None
+                       else max(0, deadline - time.perf_counter()))
+            for future in as_completed(futures, timeout=timeout):
+                phi,secs,cpu,rss = future.result()
+                tr.add('state', time.perf_counter() - secs, secs,
+                       key=futures[future], cpu_seconds=cpu, worker=True,
+                       worker_max_rss_kb=rss)
+                yield futures[future], phi, secs, cpu
+            finished = True
+        except FuturesTimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
+            # Don't wait for abandoned states.
+            pool.shutdown(wait=finished)
+    else:
+        timer1 = Timer()
+        for key,i,state in jobs:
+            if deadline is not None and time.perf_counter() > deadline:
+                return
+            timer1.tic
+            cpu0 = time.process_time()
+            with tr.span('state', key=key):
+                phi = nets[i].phi(state)
+            yield key, phi, timer1.toc, time.process_time() - cpu0
+
+
+# Checkpoint files are JSON Lines. The first line identifies the net
+# (see phial.cache.net_key); each following line is the result of one state.
+def open_checkpoint(path, netkey, append=False):
+    """RETURN: file object to write_checkpoint() to."""
+    if append and os.path.exists(path) and os.path.getsize(path) > 0:
+        drop_partial_line(path)
+        return open(path, 'a')
+    f = open(path, 'w')
+    f.write(json.dumps(dict(net=netkey)) + '\n')
+    f.flush()
+    return f
+
+def write_checkpoint(f, statestr, result):
+    f.write(json.dumps(dict(state=statestr, **result)) + '\n')
+    f.flush()
+
+def read_checkpoint(path, netkey):
+    """RETURN: dict[statestr] = result stored in checkpoint file at PATH.
+    Raise ValueError if the checkpoint is for a different net than NETKEY.
+    A truncated last line (from a killed run) is ignored.  A missing (or
+    empty) file has no results; so resuming from it is a fresh start."""
+    results = dict()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return results
+    with open(path) as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('net') != netkey:
+            raise ValueError(f'Checkpoint {path} is not for this net '
+                             '(or pyphi config has changed)')
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            s = rec.pop('state')
+            rec.pop('cached', None)
+            rec.pop('isomorphic', None)
+            results[s] = rec
+    return results
+
+
 # nodes are extracted from edges.  This means an experiment cannot contain
 # a node that has no edges. (self edge is ok)
 class Experiment():
@@ -71,11 +224,24 @@ class Experiment():
                  states={}, # dict[nodeLabel] = numStates
                  net = None,
                  default_statesPerNode=2,
-                 default_func=nf.MJ_func):
-        """Nodes not given as keys to funcs dict default to 'default_func'"""
+                 default_func=nf.MJ_func,
+                 cache=None,
+                 dedup=None):
+        """Nodes not given as keys to funcs dict default to 'default_func'
+        cache:: phial.cache.PhiCache to look up (and store) phi results in.
+           True to use one in the default directory. Default is no cache.
+        dedup:: phial.canon.DedupIndex shared by experiments. Results of
+           a net isomorphic to one already run are taken from it."""
         self.results = {}
+        self.stopped = None # why last run stopped early (if it did)
+        self._stop = threading.Event()
+        if cache is True:
+            cache = pc.PhiCache()
+        self.cache = None if cache is False else cache
+        self.dedup = dedup
         self.filename = None
         self.starttime = None
+        self.node_func_list = {} # d[nodeLabel] = [func, ...]
         self.elapsed = None
 
         if net is not None:
@@ -90,23 +256,40 @@ class Experiment():
         for label,num in states.items():
             self.net.get_node(label).num_states = num
 
-    def generate_truth(self): 
-        f = gen_truth_funcs(dict((n.label,self.net.graph.predeecessors(n.label))
-                            for n in self.net.nodes))
-        self.node_func_list = f
+    def generate_truth(self, all_funcs=False):
+        """Make the list of every possible func of each node (given the
+        number of its predecessors). Default is every symmetric (only
+        depends on the number of inputs that are on) binary func, see
+        AllPerms. With 'all_funcs=True' use every binary func (gen_funcs).
+        RETURN: d[nodeLabel] = [func, ...]"""
+        argcnt = dict((n.label,len(list(self.net.graph.predecessors(n.label))))
+                      for n in self.net.nodes)
+        if all_funcs:
+            self.node_func_list = dict((label, gf.gen_funcs(num))
+                                       for label,num in argcnt.items())
+        else:
+            self.node_func_list = gen_truth_funcs(argcnt)
+        return self.node_func_list
 
-    def gen_tpm(self, node_func_map):
-        """node_func_map: d[nodeLabel] = funcIndex"""
+    def set_funcs(self, node_func_map):
+        """Set node funcs.  Only the TPM columns (net.tpm_array) of nodes
+        whose func changed are recalculated, when next used.
+        node_func_map: d[nodeLabel] = funcIndex (into node_func_list)"""
         for n in self.net.nodes:
-            funcidx = self.node_func_map[n.label]
-            funclist = self.node_func_map[n.label]
+            funcidx = node_func_map[n.label]
+            funclist = self.node_func_list[n.label]
             n.func = funclist[min(funcidx, len(funclist)-1)]
-        self.net.calc_tpm()
+
+    def gen_tpm(self, node_func_map):
+        """Set node funcs and recalculate TPM.
+        node_func_map: d[nodeLabel] = funcIndex (into node_func_list)
+        RETURN: TPM as DataFrame"""
+        self.set_funcs(node_func_map)
         return self.net.tpm
     
     @property
     def get_num_funcs(self):
-        return dict((n.label,len(self.node_func_map.get(n.label,[])))
+        return dict((n.label,len(self.node_func_list.get(n.label,[])))
                     for n in self.net.nodes)
         
 
@@ -115,31 +298,243 @@ class Experiment():
             timestamp = str(self.starttime),
             duration = self.elapsed, # seconds
             results = self.results,
+            stopped = self.stopped,
             filename = self.filename,
             uname = platform.uname(),
         )
+        if self.cache is not None:
+            dd['cache'] = self.cache.stats
+        if self.dedup is not None:
+            dd['dedup'] = self.dedup.stats
+        if tr.enabled():
+            dd['trace'] = dict(spans=tr.current().summary(),
+                               counters=dict(tr.current().counters))
 
         return dd
         
-    def run(self, verbose=False, plot=False, **kwargs):
+    def run(self, verbose=False, plot=False, workers=None,
+            checkpoint=None, resume=None, symmetry=False, **kwargs):
+        """Calculate phi for every reachable state of net.
+        See iter_run() for the arguments. Extra kwargs go to analyze()."""
+        stop_args = dict((k,kwargs.pop(k))
+                         for k in ['progress','stop_when','phi_above','timeout']
+                         if k in kwargs)
+        with tr.span('experiment.run', title=self.title):
+            for s,phi,secs in self.iter_run(workers=workers,
+                                            checkpoint=checkpoint,
+                                            resume=resume,
+                                            symmetry=symmetry,
+                                            **stop_args):
+                if verbose:
+                    print(f"Calculated Φ = {phi} using state={s} "
+                          f"in {secs} seconds")
+        # Parallel states complete in any order. Keep results in state order.
+        self.results = dict((s,self.results[s]) for s in
+                            sorted(self.results, key=self.net.state_code))
+        if plot:
+            self.analyze(**kwargs)
+
+    def iter_run(self, workers=None, checkpoint=None, resume=None,
+                 symmetry=False,
+                 progress=None, stop_when=None, phi_above=None, timeout=None):
+        """Calculate phi for every reachable state of net. Results are
+        stored in self.results as with run() but are also generated as soon
+        as each is ready.
+        GENERATES: (statestr, phi, elapsed_seconds) in completion order.
+
+        workers:: Number of processes to spread the states over.
+           Default (None or 1) runs serially in this process.
+        checkpoint:: File to append each state's result to as it completes.
+        resume:: Checkpoint file of an earlier run of this net. States
+           already in it are not recalculated. New results are appended to
+           it (unless checkpoint names another file).  If the file does
+           not exist yet, all states are calculated and it is created.
+        symmetry:: Calculate only one state of each orbit under the
+           automorphisms of net (node permutations that keep the graph and
+           node funcs). The results of the others have 'representative' set
+           to the state their phi was copied from.
+        progress:: func(num_done, num_states, statestr, phi, elapsed_seconds)
+           called as each state completes.
+        stop_when:: func(statestr, phi, elapsed_seconds) => True to stop.
+        phi_above:: Stop after the first state with phi greater than this.
+        timeout:: Stop after this many seconds.  States being calculated
+           when time runs out are abandoned. (In serial mode the state
+           being calculated is finished first.)
+        Use stop() (e.g. from progress) or close the generator to cancel.
+        """
         timer0 = Timer()
-        timer1 = Timer()
         timer0.tic # start tracking time
         self.starttime = datetime.now()
+        self.stopped = None
+        self._stop.clear()
+        deadline = None if timeout is None else time.perf_counter() + timeout
 
-        # Calculate!
-        for s in self.net.out_states:
-            timer1.tic 
-            phi = self.net.phi(s)
-            secs = timer1.toc
-            self.results[s] = dict(phi=phi, elapsed_seconds=secs)
-            if verbose:
-                print(f"Calculated Φ = {phi} using state={s} in {secs} seconds")
-        self.elapsed = timer0.toc  # Seconds since start
-        if plot:
-            self.analyze(**kwargs)
+        spns = self.net.spns
+        codes = self.net.out_state_codes
+        statestrs = tb.codes_to_hexstrs(codes, spns)
+        todo = list(zip(statestrs, tb.decode_states(codes, spns).tolist()))
+        total = len(todo)
+        ready = [] # statestr of results known without calculating
+        netkey = None
+        if (self.cache, checkpoint, resume) != (None, None, None):
+            netkey = pc.net_key(self.net.tpm_array, self.net.cm)
+        resumed = set()
+        if resume is not None:
+            done = read_checkpoint(resume, netkey)
+            resumed = set(done)
+            self.results.update(done)
+            ready.extend(s for s,state in todo if s in done)
+            todo = [(s,state) for s,state in todo if s not in done]
+            if checkpoint is None:
+                checkpoint = resume
+        if self.cache is not None:
+            keys = dict((s,pc.state_key(netkey, state)) for s,state in todo)
+            uncached = []
+            for s,state in todo:
+                phi = self.cache.get(keys[s])
+                if phi is None:
+                    uncached.append((s,state))
+                else:
+                    self.results[s] = dict(phi=phi, elapsed_seconds=0.0,
+                                           cached=True)
+                    ready.append(s)
+            todo = uncached
+        if self.dedup is not None:
+            canon = cn.canonical_form(self.net)
+            shared = self.dedup.get(self.net, canon=canon) or dict()
+            code_of = dict(zip(statestrs, codes.tolist()))
+            remaining = []
+            for s,state in todo:
+                if code_of[s] in shared:
+                    self.results[s] = dict(phi=shared[code_of[s]],
+                                           elapsed_seconds=0.0,
+                                           isomorphic=True)
+                    ready.append(s)
+                else:
+                    remaining.append((s,state))
+            todo = remaining
+        followers = dict() # d[statestr] = [statestr in same orbit, ...]
+        if symmetry:
+            automorphisms = cn.canonical_form(self.net).automorphisms
+            rep_of = cn.state_orbits(codes, spns, automorphisms)
+            strs = dict(zip(codes.tolist(), statestrs))
+            remaining = []
+            for s,state in todo:
+                r = strs[rep_of[self.net.state_code(s)]]
+                if r == s:
+                    remaining.append((s,state))
+                elif r in self.results:
+                    self.results[s] = dict(phi=self.results[r]['phi'],
+                                           elapsed_seconds=0.0,
+                                           representative=r)
+                    ready.append(s)
+                else:
+                    followers.setdefault(r, []).append(s)
+            todo = remaining
+        ckpt = None
+        if checkpoint is not None:
+            ckpt = open_checkpoint(checkpoint, netkey,
+                                   append=(checkpoint == resume))
+            for s in ready:
+                if s not in resumed:
+                    write_checkpoint(ckpt, s, self.results[s])
+
+        def known():
+            for s in ready:
+                yield s, self.results[s]['phi'], self.results[s]['elapsed_seconds']
+        def calculated():
+            for s,phi,secs in self.calculate(todo, workers=workers,
+                                             deadline=deadline):
+                self.results[s] = dict(phi=phi, elapsed_seconds=secs)
+                if self.cache is not None:
+                    self.cache.put(keys[s], phi, secs)
+                if ckpt is not None:
+                    write_checkpoint(ckpt, s, self.results[s])
+                yield s, phi, secs
+                for f in followers.get(s, []):
+                    self.results[f] = dict(phi=phi, elapsed_seconds=0.0,
+                                           representative=s)
+                    if ckpt is not None:
+                        write_checkpoint(ckpt, f, self.results[f])
+                    yield f, phi, 0.0
+
+        num_done = 0
+        try:
+            for s,phi,secs in it.chain(known(), calculated()):
+                num_done += 1
+                if progress is not None:
+                    progress(num_done, total, s, phi, secs)
+                yield s, phi, secs
+                if self._stop.is_set():
+                    self.stopped = 'stop() called'
+                elif stop_when is not None and stop_when(s, phi, secs):
+                    self.stopped = f'stop_when({s})'
+                elif phi_above is not None and phi > phi_above:
+                    self.stopped = f'phi > {phi_above} in state {s}'
+                elif deadline is not None and time.perf_counter() > deadline:
+                    self.stopped = f'timeout after {timeout} seconds'
+                if self.stopped is not None:
+                    break
+            else:
+                if num_done < total:
+                    self.stopped = f'timeout after {timeout} seconds'
+            if self.dedup is not None and self.stopped is None:
+                self.dedup.add(self.net,
+                               dict((code,self.results[s]['phi'])
+                                    for code,s in zip(codes.tolist(),
+                                                      statestrs)),
+                               canon=canon)
+        except GeneratorExit:
+            self.stopped = 'cancelled'
+            raise
+        finally:
+            if ckpt is not None:
+                ckpt.close()
+            # Repertoires are shared by the states of one run only.
+            self.net.clear_phi_caches()
+            self.elapsed = timer0.toc  # Seconds since start
+
+    async def aiter_run(self, **kwargs):
+        """Asyncio version of iter_run() (same arguments). Calculation runs
+        in a thread so the event loop is free while waiting for states.
+        GENERATES: (statestr, phi, elapsed_seconds) in completion order."""
+        loop = asyncio.get_running_loop()
+        gen = self.iter_run(**kwargs)
+        done = object()
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(None, next, gen, done)
+                result = await asyncio.shield(pending)
+                pending = None
+                if result is done:
+                    break
+                yield result
+        finally:
+            if pending is not None:
+                # Cancelled while a state is in progress. Let it finish.
+                self.stop()
+                await pending
+            gen.close()
+
+    def stop(self):
+        """Stop a running iter_run() (or run) after the current state."""
+        self._stop.set()
+
+    def calculate(self, todo, workers=None, deadline=None):
+        """Calculate phi for each (statestr, state) in TODO.
+        Where state is a list of the state of each node.
+        deadline:: time.perf_counter() value to give up at.
+        GENERATES: (statestr, phi, elapsed_seconds) as each completes."""
+        jobs = [(s,0,state) for s,state in todo]
+        for s,phi,secs,cpu in calculate_jobs([self.net], jobs,
+                                             workers=workers,
+                                             deadline=deadline):
+            yield s, phi, secs
 
     def analyze(self, figsize=(14,4), countUnreachable=False):
+        import matplotlib.pyplot as plt
+        import pandas as pd
         dd = dict((s,v['phi']) for s,v in self.results.items())
         if countUnreachable:
             dd.update(dict((s,-1) for s in self.net.unreachable_states))
@@ -152,6 +547,121 @@ class Experiment():
         hist = dff.hist(bins=100, ax=ax[0])
         fig.suptitle(self.title)
         
+##############################################################################
+# Suites: many nets run together
+
+def experiment_from_json(jj, default_func='XOR', SpN=2, cache=None,
+                         dedup=None):
+    """Experiment from net definition dict (see examples/suite1.json).
+    Must contain "edges". Optional keys: "funcs", "title", "comment"."""
+    funcs = dict((node,nf.funcLUT.get(func,nf.MJ_func))
+                 for node,func in jj.get('funcs',{}).items())
+    return Experiment(jj.get('edges',[]),
+                      title = jj.get('title',''),
+                      comment = jj.get('comment'),
+                      funcs = funcs,
+                      default_statesPerNode = SpN,
+                      default_func = nf.funcLUT.get(default_func,nf.MJ_func),
+                      cache = cache,
+                      dedup = dedup)
+
+def load_suite(path):
+    """Net definitions from PATH. Either a directory of JSON files (one net
+    each) or a JSON Lines file (one net per line).
+    RETURN: list of (name, net_definition_dict)"""
+    if os.path.isdir(path):
+        defs = []
+        for fname in sorted(os.listdir(path)):
+            if fname.endswith('.json'):
+                with open(os.path.join(path, fname)) as f:
+                    defs.append((fname, json.load(f)))
+        return defs
+    with open(path) as f:
+        return [(f'{path}:{lineno}', json.loads(line))
+                for lineno,line in enumerate(f, 1)
+                if line.strip()]
+
+def run_suite(experiments, workers=None, outfile=None, names=None,
+              verbose=False):
+    """Calculate phi for every reachable state of every Experiment. All the
+    (net,state) jobs are scheduled on one shared pool of workers.
+    Results are stored in the results of each Experiment and streamed (one
+    record per job) to OUTFILE.  CSV if its name ends in '.csv', else JSON
+    Lines.
+    Results of experiments with a cache (see Experiment) are looked up in
+    it first; they are output with zero elapsed_seconds.
+    names:: name of each experiment used in output (default: its title)
+    RETURN: dict summarizing throughput and time used."""
+    if names is None:
+        names = [exp.title for exp in experiments]
+    jobs = []
+    cached = dict() # d[(i,statestr)] = phi
+    keys = dict() # d[(i,statestr)] = cache key
+    for i,exp in enumerate(experiments):
+        exp.starttime = datetime.now()
+        spns = exp.net.spns
+        codes = exp.net.out_state_codes
+        states = zip(tb.codes_to_hexstrs(codes, spns),
+                     tb.decode_states(codes, spns).tolist())
+        if exp.cache is None:
+            jobs.extend(((i,s),i,state) for s,state in states)
+            continue
+        netkey = pc.net_key(exp.net.tpm_array, exp.net.cm)
+        for s,state in states:
+            keys[(i,s)] = pc.state_key(netkey, state)
+            phi = exp.cache.get(keys[(i,s)])
+            if phi is None:
+                jobs.append(((i,s),i,state))
+            else:
+                cached[(i,s)] = phi
+    fields = ['net', 'state', 'phi', 'elapsed_seconds', 'cpu_seconds']
+    if outfile is not None and getattr(outfile, 'name', '').endswith('.csv'):
+        writer = csv.DictWriter(outfile, fieldnames=fields)
+        writer.writeheader()
+        write = writer.writerow
+    elif outfile is not None:
+        write = lambda rec: outfile.write(json.dumps(rec) + '\n')
+    else:
+        write = lambda rec: None
+
+    timer = Timer()
+    timer.tic
+    cpu0 = time.process_time()
+    job_seconds = job_cpu = 0.0
+    calculated = calculate_jobs([exp.net for exp in experiments],
+                                jobs, workers=workers)
+    for (i,s),phi,secs,cpu in it.chain(((key,phi,0.0,0.0)
+                                        for key,phi in cached.items()),
+                                       calculated):
+        if (i,s) in keys and (i,s) not in cached:
+            experiments[i].cache.put(keys[(i,s)], phi, secs)
+        experiments[i].results[s] = dict(phi=phi, elapsed_seconds=secs)
+        job_seconds += secs
+        job_cpu += cpu
+        write(dict(zip(fields, [names[i], s, phi, secs, cpu])))
+        if outfile is not None:
+            outfile.flush()
+        if verbose:
+            print(f"{names[i]}: Φ = {phi} using state={s} in {secs} seconds")
+    wall = timer.toc
+    if workers is not None and workers > 1:
+        job_cpu += time.process_time() - cpu0 # plus our own overhead
+    else:
+        job_cpu = time.process_time() - cpu0
+    for exp in experiments:
+        exp.elapsed = wall
+    return dict(
+        num_nets = len(experiments),
+        num_states = len(jobs) + len(cached),
+        num_cached = len(cached),
+        workers = workers or 1,
+        wall_seconds = wall,
+        cpu_seconds = job_cpu,
+        job_seconds = job_seconds, # sum of per-state elapsed seconds
+        states_per_second = len(jobs)/wall if wall > 0 else None,
+        cpu_per_wall = job_cpu/wall if wall > 0 else None,
+    )
+
 ##############################################################################
 
 def main():
@@ -166,16 +676,39 @@ def main():
     parser.add_argument('net',
                         help=('Net definition in JSON format containing '
                               'at least "edges" key. '
-                              'Optional keys: "funcs", "title"') )
+                              'Optional keys: "funcs", "title". '
+                              'Or a suite of them: a directory of such files '
+                              'or a JSON Lines file with one per line.') )
     parser.add_argument('--default_func',
                         default=dflt_func,
                         help=('Default function '
                               'when not explicitly specified for a node.'))
     parser.add_argument('--SpN',
-                        default=dflt_spn,
+                        default=dflt_spn, type=int,
                         help=('Default number of states per node '
                               'when not explicitly specified for a node.'))
-    parser.add_argument('--outfile', help='File to save experiment into',
+    parser.add_argument('--workers', type=int, default=None,
+                        help=('Number of processes to calculate states in. '
+                              'Default runs serially.'))
+    parser.add_argument('--cache', action='store_true',
+                        help=('Look up (and store) phi results in the '
+                              'persistent cache. Directory is $PHIAL_CACHE_DIR '
+                              'or ~/.cache/phial'))
+    parser.add_argument('--checkpoint',
+                        help=('File to append each result to as it is '
+                              'calculated.'))
+    parser.add_argument('--resume',
+                        help=('Checkpoint file of an interrupted run to '
+                              'continue from.'))
+    parser.add_argument('--symmetry', action='store_true',
+                        help=('Calculate one state per orbit under the '
+                              'automorphisms of the net.'))
+    parser.add_argument('--trace',
+                        help=('Write where the time went (spans of each '
+                              'phase) to this file in Chrome trace format.'))
+    parser.add_argument('--outfile',
+                        help=('File to save results of a suite into. '
+                              'CSV if name ends in ".csv", else JSON Lines.'),
                         type=argparse.FileType('w') )
     parser.add_argument('--loglevel',      help='Kind of diagnostic output',
                         choices = ['CRTICAL','ERROR','WARNING','INFO','DEBUG'],
@@ -190,16 +723,45 @@ def main():
                         datefmt='%m-%d %H:%M'
                         )
     #logging.debug('Debug output is enabled!!!')
+    if os.path.isdir(args.net) or args.net.endswith('.jsonl'):
+        # These are options of one net's run. (Use --outfile for a suite.)
+        for opt in ['checkpoint', 'resume', 'symmetry']:
+            if getattr(args, opt):
+                parser.error(f'--{opt} cannot be used with a suite')
+        defs = load_suite(args.net)
+        cache = pc.PhiCache() if args.cache else None
+        exps = [experiment_from_json(jj, default_func=args.default_func,
+                                     SpN=args.SpN, cache=cache)
+                for name,jj in defs]
+        tracer = tr.enable() if args.trace else None
+        summary = run_suite(exps, workers=args.workers, outfile=args.outfile,
+                            names=[name for name,jj in defs])
+        if tracer is not None:
+            tr.disable()
+            tracer.write_chrome_trace(args.trace)
+        print(f"""# SUITE: {args.net}
+Nets              {summary['num_nets']}
+States            {summary['num_states']}
+Cached            {summary['num_cached']}
+Workers           {summary['workers']}
+Wall clock (sec)  {summary['wall_seconds']}
+CPU (sec)         {summary['cpu_seconds']}
+States per second {summary['states_per_second']}
+""")
+        return
     with open(args.net, 'r') as f:
         jj = json.load(f)
-    funcs = dict((node,nf.funcLUT.get(func,nf.MJ_func))
-                 for node,func in jj.get('funcs').items())
-    exp = Experiment(jj.get('edges',[]),
-                     funcs = funcs,
-                     default_statesPerNode = args.SpN,
-                     default_func = nf.funcLUT.get(args.default_func,nf.MJ_func))
-    exp.run()
+    exp = experiment_from_json(jj, default_func=args.default_func,
+                               SpN=args.SpN, cache=args.cache)
+    tracer = tr.enable() if args.trace else None
+    exp.run(workers=args.workers,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            symmetry=args.symmetry)
     res = exp.info()
+    if tracer is not None:
+        tr.disable()
+        tracer.write_chrome_trace(args.trace)
     answers = ', '.join([f'{s}={phi}' for (s,phi) in res['results'].items()])
     print(f"""# EXPERIMENT: {jj.get('title','')}
 Time Started      {res['timestamp']}
@@ -1,4 +1,8 @@
 import itertools as it
+import copy
+import random
+from math import comb
+import numpy as np
 
 # https://docs.python.org/3/library/itertools.html?highlight=product#itertools.product
 def powerset(iterable):
@@ -6,21 +10,249 @@ def powerset(iterable):
     s = list(iterable)
     return it.chain.from_iterable(it.combinations(s, r) for r in range(len(s)+1))
 
-def func_from_true_states(true_states, N=999):
+
+class BoolFunc():
+    """Binary function of N binary inputs stored as an integer bitmask
+    truth table. Bit k of table is the output for the inputs that pack
+    (first input most significant, as in itertools.product) to k.
+    Inputs that are not binary give 0.
+
+    >>> xor = BoolFunc.from_true_states(((0, 1), (1, 0)), N=2)
+    >>> xor.table, xor([1,0]), xor([1,1])
+    (6, 1, 0)
+    >>> xor.eval([[0,0],[0,1],[1,0],[1,1]]).tolist()
+    [0, 1, 1, 0]
+    >>> (~xor).true_states
+    ((0, 0), (1, 1))
+    >>> f = BoolFunc.from_true_states(((1, 0),), N=2)
+    >>> f.permute([1,0]).true_states
+    ((0, 1),)
+    """
+    def __init__(self, table, N, name=None):
+        """table:: int; bit k is output for packed inputs k
+        N:: number of inputs"""
+        if table < 0 or table.bit_length() > 2**N:
+            raise ValueError(f'Truth table {table} has more than 2^{N} bits')
+        self.N = N
+        self.table = table
+        self.__name__ = name or f'BoolFunc{N}_{table}'
+        self._lut = None
+
+    @classmethod
+    def from_true_states(cls, true_states, N, name=None):
+        """TRUE_STATES:: inputs (tuples of 0,1) for which output is 1"""
+        table = 0
+        for inputs in true_states:
+            table |= 1 << cls._pack(inputs)
+        return cls(table, N, name=name)
+
+    @classmethod
+    def from_lut(cls, lut, name=None):
+        """LUT:: output (0,1) for each packed input state. len(lut) = 2^N"""
+        N = (len(lut) - 1).bit_length()
+        if len(lut) != 2**N:
+            raise ValueError(f'LUT length {len(lut)} is not a power of 2')
+        table = sum(1 << k for k,out in enumerate(lut) if out)
+        return cls(table, N, name=name)
+
+    @classmethod
+    def from_func(cls, func, N):
+        """Tabulate FUNC (e.g. a node_functions.funcLUT value) for N inputs.
+
+        >>> import phial.node_functions as nf
+        >>> BoolFunc.from_func(nf.funcLUT['MJ'], 3).true_states
+        ((0, 1, 1), (1, 0, 1), (1, 1, 0), (1, 1, 1))
+        """
+        name = getattr(func, '__name__', None)
+        return cls.from_lut([func(list(inputs))
+                             for inputs in it.product([0,1], repeat=N)],
+                            name=name)
+
+    @staticmethod
+    def _pack(inputs):
+        k = 0
+        for v in inputs:
+            k = 2*k + v
+        return k
+
+    def __call__(self, inputs):
+        if len(inputs) != self.N:
+            raise ValueError(f'Function requires {self.N} args, '
+                             f'got {len(inputs)}')
+        k = 0
+        for v in inputs:
+            if v != 0 and v != 1:
+                return 0
+            k = 2*k + v
+        return (self.table >> k) & 1
+
+    @property
+    def lut(self):
+        """Truth table as uint8 ndarray indexed by packed inputs."""
+        if self._lut is None:
+            size = 2**self.N
+            data = self.table.to_bytes((size + 7)//8, 'little')
+            self._lut = np.unpackbits(np.frombuffer(data, dtype=np.uint8),
+                                      bitorder='little')[:size]
+        return self._lut
+
+    def eval(self, inputs):
+        """Output for each row of INPUTS (2D array of 0,1; N columns)."""
+        inputs = np.asarray(inputs, dtype=np.int64).reshape(-1, self.N)
+        weights = 2**np.arange(self.N - 1, -1, -1, dtype=np.int64)
+        return self.lut[inputs @ weights]
+
+    @property
+    def true_states(self):
+        """Inputs for which output is 1 (in itertools.product order)."""
+        return tuple(inputs for k,inputs in
+                     enumerate(it.product([0,1], repeat=self.N))
+                     if (self.table >> k) & 1)
+
+    def __invert__(self):
+        return BoolFunc(self.table ^ (2**(2**self.N) - 1), self.N,
+                        name=f'NOT_{self.__name__}')
+
+    def permute(self, order):
+        """RETURN: func g with input i of g going to input ORDER[i] of self.
+        g(x) = self(y) where y[order[i]] = x[i]"""
+        if sorted(order) != list(range(self.N)):
+            raise ValueError(f'{order} is not a permutation of {self.N} inputs')
+        lut = self.lut.reshape([2]*self.N).transpose(order).ravel()
+        return BoolFunc.from_lut(lut)
+
+    def __eq__(self, other):
+        return (isinstance(other, BoolFunc)
+                and (self.N, self.table) == (other.N, other.table))
+
+    def __hash__(self):
+        return hash((self.N, self.table))
+
+    def __repr__(self):
+        return f'BoolFunc({self.table}, {self.N}, name={self.__name__!r})'
+
+
+def func_from_true_states(true_states, N=None):
     """RETURN a binary function of N inputs such that iff function inputs
-    match on of true_states then output is 1."""
-    def binary_func(inputs):
-        assert len(inputs) == N, f'Function requires {N} args, got {len(inputs)}'
-        return int(tuple(inputs) in true_states)
-    binary_func.true_states = true_states # info only
-    return binary_func
+    match on of true_states then output is 1.
+    Default N is the length of the true_states."""
+    if N is None:
+        if len(true_states) == 0:
+            raise ValueError('N required when there are no true_states')
+        N = len(true_states[0])
+    return BoolFunc.from_true_states(true_states, N)
+
+
+class FuncSpace():
+    """All 2^2^N binary functions of N binary inputs. Functions are made
+    on demand (as BoolFunc) so the space is never held in memory.
+    Ordered as powerset() of the input states; the same order gen_funcs()
+    has always used.  Supports len(), indexing, slicing (which gives
+    another FuncSpace), iteration, shard() and sample().
+
+    >>> space = FuncSpace(2)
+    >>> len(space), space[8].true_states
+    (16, ((0, 1), (1, 0)))
+    >>> [f.true_states for f in space[1:5]]
+    [((0, 0),), ((0, 1),), ((1, 0),), ((1, 1),)]
+    >>> space.index(space[8]), len(space.shard(1, 3))
+    (8, 5)
+    >>> FuncSpace(5).size
+    4294967296
+    """
+    def __init__(self, N, span=None):
+        """span:: range of indices (into the full space) in this view"""
+        self.N = N
+        self.span = range(self.num_all) if span is None else span
+
+    @property
+    def num_all(self):
+        """Number of funcs in the full space (not just this view)."""
+        return 2**(2**self.N)
+
+    def func(self, index):
+        """RETURN: func number INDEX of the full space."""
+        if not 0 <= index < self.num_all:
+            raise IndexError(f'Func {index} not in space of {self.num_all}')
+        # Subsets of the M input states in powerset order: by size, then
+        # in itertools.combinations order.
+        M = 2**self.N
+        size = 0
+        while index >= comb(M, size):
+            index -= comb(M, size)
+            size += 1
+        table = 0
+        state = 0
+        for remaining in range(size, 0, -1):
+            while index >= comb(M - state - 1, remaining - 1):
+                index -= comb(M - state - 1, remaining - 1)
+                state += 1
+            table |= 1 << state
+            state += 1
+        return BoolFunc(table, self.N)
+
+    def rank(self, func):
+        """RETURN: index of FUNC in the full space. Inverse of func()."""
+        M = 2**self.N
+        states = [k for k in range(M) if (func.table >> k) & 1]
+        size = len(states)
+        index = sum(comb(M, r) for r in range(size))
+        prev = -1
+        for j,state in enumerate(states):
+            for skipped in range(prev + 1, state):
+                index += comb(M - skipped - 1, size - j - 1)
+            prev = state
+        return index
+
+    def index(self, func):
+        """RETURN: position of FUNC in this view."""
+        return self.span.index(self.rank(func))
+
+    @property
+    def size(self):
+        """Number of funcs in this view. Unlike len(), works for huge spaces."""
+        r = self.span
+        return max(0, (r.stop - r.start + r.step - (1 if r.step > 0 else -1))
+                   // r.step)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            view = copy.copy(self)
+            view.span = self.span[key]
+            return view
+        return self.func(self.span[key])
+
+    def __iter__(self):
+        for index in self.span:
+            yield self.func(index)
+
+    def shard(self, k, num):
+        """Every NUM-th func starting at the K-th. For splitting a space over
+        NUM workers."""
+        return self[k::num]
+
+    def sample(self, num, seed=None):
+        """RETURN: list of NUM distinct random funcs of this view."""
+        rng = random.Random(seed)
+        if num > self.size:
+            raise ValueError(f'Sample of {num} larger than space of {self.size}')
+        chosen = dict() # ordered set of positions
+        while len(chosen) < num:
+            chosen[rng.randrange(self.size)] = None
+        return [self[pos] for pos in chosen]
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.N}, span={self.span})'
 
 
 def gen_funcs(N):
     """Generate all possible 4^N binary functions of N binary inputs.
     Num in-states = 2^N.
     Functions include all (2^2^N) possible ouputs for those in-states.
-    RETURN: list of functions, f(inputs)=>0,1
+    RETURN: FuncSpace (lazy sequence) of functions, f(inputs)=>0,1
 
     >>> len(gen_funcs(2))
     16
@@ -29,8 +261,4 @@ def gen_funcs(N):
     >>> gen_funcs(2)[8]([1,0])         # run XOR
     1
     """
-    return [func_from_true_states(true_states, N=N)
-            for true_states in powerset(it.product([0,1], repeat=N))]
-    
-
-    
+    return FuncSpace(N)
@@ -0,0 +1,300 @@
+"""Simulate a net from a batch of states without its TPM.
+
+A TPM has a row for every one of the (2^N) states so it is out of reach
+for big nets.  Their dynamics can still be sampled: each step looks up
+the next state of every node in the truth table of its func, indexed by
+the packed states of its predecessors (the same as Net.eval_node), for
+thousands of states at once.
+
+States are rows of node states (2D int ndarray, one column per node) not
+state codes, which don't fit in an int64 past 63 binary nodes.
+
+Binary nets (with at most BITS_MAX_INPUTS inputs per node) are stepped
+bit-sliced: the states of a node in 64 trajectories are the bits of one
+uint64 and its truth table is evaluated as an OR of minterms.
+
+Attractors of each trajectory are found with Brent's cycle detection;
+only a couple of states per trajectory are kept while searching.
+"""
+# External packages
+import numpy as np
+
+# Most inputs of a node for bit-sliced steps (2^N minterms per node).
+BITS_MAX_INPUTS = 6
+
+
+class Simulator():
+    """Steps batches of states of a net.
+    InstanceVars: spns, pred_ptr, pred_idx, dtype
+    The predecessors of node i are pred_idx[pred_ptr[i]:pred_ptr[i+1]]
+    (CSR, see toolbox.NodeStore).
+
+    >>> # A <- B, B <- A (swap); C <- A,B (XOR)
+    >>> sim = Simulator([2,2,2], [0,1,2,4], [1,0,0,1],
+    ...                 [[0,1], [0,1], [0,1,1,0]])
+    >>> sim.step([[1,0,0], [1,1,0]]).tolist()
+    [[0, 1, 1], [1, 1, 0]]
+    >>> res = sim.attractors([[1,0,0], [1,1,0], [0,0,1]])
+    >>> res['transient'].tolist(), res['period'].tolist()
+    ([1, 0, 1], [2, 1, 1])
+    >>> res['attractor'].tolist(), res['attractors'].tolist()
+    ([1, 2, 0], [[0, 0, 0], [0, 1, 1], [1, 1, 0]])
+    """
+    # Most (node x state) entries to work on at once in a step
+    chunk_entries = 2**22
+
+    def __init__(self, spns, pred_ptr, pred_idx, luts):
+        """spns:: States Per Node for each node
+        pred_ptr, pred_idx:: predecessors of each node (CSR); in the order
+           the node func gets them as inputs
+        luts:: truth table of each node func (see Node.compile).  Nodes may
+           share the same ndarray."""
+        self.spns = np.asarray(spns, dtype=np.int64)
+        self.pred_ptr = np.asarray(pred_ptr, dtype=np.int64)
+        self.pred_idx = np.asarray(pred_idx, dtype=np.int64)
+        self.dtype = np.min_scalar_type(max(int(np.max(self.spns, initial=2)) - 1, 1))
+
+        # One flat table; node i looks up lut[lut_offset[i] + packedInputs]
+        offsets = dict() # d[id(lut)] = offset
+        tables = []
+        size = 0
+        self.lut_offset = np.empty(len(self.spns), dtype=np.int64)
+        for i,lut in enumerate(luts):
+            if id(lut) not in offsets:
+                offsets[id(lut)] = size
+                tables.append(np.asarray(lut, dtype=self.dtype))
+                size += len(tables[-1])
+            self.lut_offset[i] = offsets[id(lut)]
+        self.lut = np.concatenate(tables + [np.zeros(0, dtype=self.dtype)])
+
+        # Nodes with the same number of inputs are stepped together.
+        # groups:: [(nodes, preds, weights), ...] where preds[j] are the
+        # predecessors of nodes[j] and weights[j] their place values in
+        # its packed inputs; first predecessor most significant (see
+        # radix_weights).
+        self.groups = []
+        degree = np.diff(self.pred_ptr)
+        for d in np.unique(degree).tolist():
+            nodes = np.flatnonzero(degree == d)
+            preds = self.pred_idx[self.pred_ptr[nodes][:,None] + np.arange(d)]
+            radix = self.spns[preds]
+            weights = np.ones_like(radix)
+            weights[:,:-1] = np.cumprod(radix[:,:0:-1], axis=1)[:,::-1]
+            self.groups.append((nodes, preds, weights))
+        self.bitsliced = (bool((self.spns == 2).all())
+                          and int(degree.max(initial=0)) <= BITS_MAX_INPUTS)
+
+    def __len__(self):
+        return len(self.spns)
+
+    def random_states(self, num, seed=None):
+        """NUM states drawn uniformly at random. SEED may be a
+        np.random.Generator."""
+        rng = np.random.default_rng(seed)
+        return rng.integers(0, self.spns, size=(num, len(self)),
+                            dtype=self.dtype)
+
+    def step(self, states, noise=0.0, rng=None):
+        """Next state of each of STATES.
+        noise:: Probability of each node going to a (uniformly chosen)
+           different state than its func gives.  Flips binary nodes.
+        rng:: np.random.Generator (or seed) for noise."""
+        return self.run(states, 1, noise=noise, seed=rng)
+
+    def _step_nodes(self, states, noise=0.0, rng=None):
+        """step() of STATES held one row per node (column per state); so
+        the inputs of a node are whole rows."""
+        out = np.empty_like(states)
+        num = states.shape[1]
+        for nodes,preds,weights in self.groups:
+            block = max(1, self.chunk_entries // max(num, 1))
+            for start in range(0, len(nodes), block):
+                stop = start + block
+                packed = np.zeros((len(nodes[start:stop]), num), dtype=np.int64)
+                for k in range(preds.shape[1]):
+                    packed += (states[preds[start:stop,k]]
+                               * weights[start:stop,k,None])
+                packed += self.lut_offset[nodes[start:stop],None]
+                out[nodes[start:stop]] = self.lut[packed]
+        if noise > 0:
+            rng = np.random.default_rng(rng)
+            spns = self.spns[:,None]
+            flip = rng.random(out.shape) < noise
+            shift = 1 + (rng.random(out.shape) * (spns - 1)).astype(np.int64)
+            out[flip] = ((out.astype(np.int64) + shift) % spns)[flip]
+        return out
+
+    def _step_bits(self, bits, noise=0.0, rng=None):
+        """step() of binary states held bit-sliced; bits[i] are the states
+        of node i (uint64 words, one bit per state)."""
+        out = np.zeros_like(bits)
+        ones = ~np.uint64(0)
+        words = bits.shape[1]
+        for nodes,preds,weights in self.groups:
+            d = preds.shape[1]
+            tables = self.lut[self.lut_offset[nodes][:,None] + np.arange(2**d)]
+            block = max(1, self.chunk_entries // max(words * 8, 1))
+            for start in range(0, len(nodes), block):
+                stop = start + block
+                inputs = [bits[preds[start:stop,k]] for k in range(d)]
+                result = np.zeros((len(nodes[start:stop]), words),
+                                  dtype=np.uint64)
+                for m in range(2**d):
+                    on = tables[start:stop,m].astype(bool)
+                    if not on.any():
+                        continue
+                    term = np.where(on, ones, np.uint64(0))[:,None]
+                    for k in range(d):
+                        if (m >> (d - 1 - k)) & 1:
+                            term = term & inputs[k]
+                        else:
+                            term = term & ~inputs[k]
+                    result |= term
+                out[nodes[start:stop]] = result
+        if noise > 0:
+            rng = np.random.default_rng(rng)
+            block = max(1, self.chunk_entries // max(words * 64, 1))
+            for start in range(0, len(out), block):
+                flips = rng.random((len(out[start:start+block]), words * 64))
+                out[start:start+block] ^= _pack_bits(flips < noise)
+        return out
+
+    # A batch is held one row per node while stepping (bit-sliced if
+    # self.bitsliced, else a column per state).
+    def _encode(self, states):
+        if self.bitsliced:
+            return _pack_bits(states.T)
+        return np.ascontiguousarray(states.T)
+
+    def _decode(self, batch, num):
+        if self.bitsliced:
+            return _unpack_bits(batch, num).T.astype(self.dtype)
+        return np.ascontiguousarray(batch.T)
+
+    def _advance(self, batch, noise=0.0, rng=None):
+        if self.bitsliced:
+            return self._step_bits(batch, noise, rng)
+        return self._step_nodes(batch, noise, rng)
+
+    def _differ(self, a, b, num):
+        """Bool per state; True where batches A and B differ."""
+        if self.bitsliced:
+            diff = np.bitwise_or.reduce(a ^ b, axis=0)
+            return _unpack_bits(diff[None,:], num)[0].astype(bool)
+        return (a != b).any(axis=0)
+
+    def _select(self, mask, a, b):
+        """Batch of A where MASK (per state) else B."""
+        if self.bitsliced:
+            m = _pack_bits(mask[None,:])
+            return (a & m) | (b & ~m)
+        return np.where(mask[None,:], a, b)
+
+    def run(self, states, steps, noise=0.0, seed=None, record=False):
+        """Advance STATES by STEPS steps.
+        RETURN: final states, or all of them (ndarray of shape
+        (steps+1, len(states), len(self))) if RECORD."""
+        rng = np.random.default_rng(seed)
+        states = np.asarray(states, dtype=self.dtype).reshape(-1, len(self))
+        batch = self._encode(states)
+        trajectory = [states]
+        for t in range(steps):
+            batch = self._advance(batch, noise=noise, rng=rng)
+            if record:
+                trajectory.append(self._decode(batch, len(states)))
+        if record:
+            return np.stack(trajectory)
+        return self._decode(batch, len(states)) if steps else states
+
+    def attractors(self, states, max_steps=1000):
+        """Run each of STATES (deterministically) to its attractor.
+        Trajectories that find no cycle in MAX_STEPS steps have -1 for all.
+        RETURN: dict of ndarrays;
+          transient:: steps before reaching the attractor
+          period:: length of the attractor (cycle)
+          attractor:: index into attractors
+          attractors:: one row per distinct attractor found; its smallest
+             (lexigraphically) state"""
+        start = np.asarray(states, dtype=self.dtype).reshape(-1, len(self))
+        num = len(start)
+        period = np.full(num, -1, dtype=np.int64)
+        transient = np.full(num, -1, dtype=np.int64)
+        attractor = np.full(num, -1, dtype=np.int64)
+        first = self._encode(start)
+
+        # Brent: the hare runs ahead, the tortoise jumps to it at powers of 2.
+        # The whole batch steps together; finished trajectories just ride.
+        tortoise = first
+        hare = self._advance(first)
+        power = np.ones(num, dtype=np.int64)
+        lam = np.ones(num, dtype=np.int64)
+        for t in range(max_steps):
+            searching = period < 0
+            same = searching & ~self._differ(hare, tortoise, num)
+            period[same] = lam[same]
+            searching &= ~same
+            if not searching.any():
+                break
+            jump = searching & (power == lam)
+            tortoise = self._select(jump, hare, tortoise)
+            power[jump] *= 2
+            lam[jump] = 0
+            hare = self._advance(hare)
+            lam[searching] += 1
+        found = period > 0
+        longest = int(period.max(initial=0))
+
+        # Transient: hare starts PERIOD steps ahead; meet where cycle starts.
+        tortoise = hare = first
+        for t in range(longest):
+            hare = self._select(period > t, self._advance(hare), hare)
+        transient[found] = 0
+        moving = found & self._differ(hare, tortoise, num)
+        while moving.any():
+            tortoise = self._select(moving, self._advance(tortoise), tortoise)
+            hare = self._select(moving, self._advance(hare), hare)
+            transient[moving] += 1
+            moving &= self._differ(hare, tortoise, num)
+
+        # Walk each cycle to name its attractor by its smallest state.
+        if not found.any():
+            return dict(transient=transient, period=period,
+                        attractor=attractor,
+                        attractors=np.zeros((0, len(self)), dtype=self.dtype))
+        cycle_states = []
+        owner = []
+        state = tortoise
+        for t in range(longest):
+            on = np.flatnonzero(period > t)
+            cycle_states.append(self._decode(state, num)[on])
+            owner.append(on)
+            state = self._advance(state)
+        uniq,inverse = np.unique(np.concatenate(cycle_states), axis=0,
+                                 return_inverse=True)
+        smallest = np.full(num, len(uniq), dtype=np.int64)
+        np.minimum.at(smallest, np.concatenate(owner), inverse.ravel())
+        reps,attractor[found] = np.unique(smallest[found], return_inverse=True)
+        return dict(transient=transient, period=period, attractor=attractor,
+                    attractors=uniq[reps])
+
+    def sample_successors(self, num, seed=None):
+        """Distinct next states of NUM random states; a sample of the
+        states the net can reach (its out_states).
+        RETURN: ndarray of states (rows), sorted"""
+        return np.unique(self.step(self.random_states(num, seed)), axis=0)
+
+
+def _pack_bits(rows):
+    """Rows of 0/1 (2D) as rows of uint64 words; bit j of the row is in
+    bit j%64 of word j//64."""
+    rows = np.asarray(rows, dtype=bool)
+    words = -(-rows.shape[1] // 64)
+    packed = np.zeros((rows.shape[0], words * 8), dtype=np.uint8)
+    packed[:,:-(-rows.shape[1] // 8) or None] = np.packbits(
+        rows, axis=1, bitorder='little')
+    return packed.view('<u8')
+
+def _unpack_bits(words, num):
+    """First NUM bits of each row of WORDS (see _pack_bits) as uint8."""
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1,
+                         count=num, bitorder='little')
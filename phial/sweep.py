@@ -0,0 +1,227 @@
+#! /usr/bin/env python
+"""Sweep over assignments of mechanisms (node funcs) to the nodes of one
+topology.  For each assignment: build the TPM and calculate phi for every
+reachable state.
+
+Assignments are numbered (mixed radix over the func index of each node)
+so a sweep can be enumerated in full, randomly sampled, or split up by
+index.  Results are written one line (JSON) per assignment as each
+completes. Re-running with the same outfile skips assignments already
+in it.
+
+Many assignments give the same net with its nodes relabeled.  Only the
+first of each such class is calculated; the others get its results
+mapped to their own states (see phial.canon).
+"""
+# Python standard library
+import argparse
+import json
+import os
+import random
+# External packages
+import numpy as np
+# Local packages
+import phial.toolbox as tb
+import phial.canon as cn
+from phial.experiment import Experiment, calculate_jobs, experiment_from_json
+from phial.utils import Timer, drop_partial_line
+
+
+class Sweep():
+    """All assignments of funcs to nodes of a net.
+    InstanceVars: exp, labels, counts
+    """
+    def __init__(self, edges=None, title='', all_funcs=False, exp=None):
+        """all_funcs:: Use every binary func of the inputs of each node
+           instead of only the symmetric ones. See
+           Experiment.generate_truth()"""
+        self.exp = exp if exp is not None else Experiment(edges, title=title)
+        if not self.exp.node_func_list:
+            self.exp.generate_truth(all_funcs=all_funcs)
+        self.labels = [n.label for n in self.exp.net.nodes]
+        num_funcs = self.exp.get_num_funcs
+        self.counts = [num_funcs[label] for label in self.labels]
+
+    def __len__(self):
+        return int(np.prod(self.counts, dtype=object))
+
+    def assignment(self, index):
+        """RETURN: d[nodeLabel] = funcIndex of assignment number INDEX.
+        First node is the most significant digit."""
+        if not 0 <= index < len(self):
+            raise IndexError(f'Assignment {index} not in sweep of {len(self)}')
+        funcidx = []
+        for count in reversed(self.counts):
+            index,idx = divmod(index, count)
+            funcidx.append(idx)
+        return dict(zip(self.labels, reversed(funcidx)))
+
+    def indices(self, sample=None, seed=None, start=0, stop=None, step=1):
+        """Assignment numbers to run. All of them (optionally a range, e.g.
+        to split a sweep across machines) or a random SAMPLE of that many."""
+        indices = range(len(self))[start:stop:step]
+        if sample is not None and sample < len(indices):
+            indices = sorted(random.Random(seed).sample(indices, sample))
+        return indices
+
+    def net(self, index):
+        """Net with funcs (and TPM) of assignment number INDEX. Node
+        num_states are those of the sweep's net."""
+        self.exp.set_funcs(self.assignment(index))
+        return self.exp.net.copy(title=f'{self.exp.title} #{index}')
+
+    def run(self, outfile, indices=None, workers=None, batch_size=100,
+            dedup=True, verbose=False):
+        """Calculate phi over all reachable states for each assignment in
+        INDICES (default: all). Assignments already in OUTFILE are skipped.
+        States of a batch of assignments share one pool of workers.
+        dedup:: Calculate only one assignment of each class of isomorphic
+           nets. Records of the others have "same_as" set to its index.
+        RETURN: number of assignments calculated."""
+        if indices is None:
+            indices = self.indices()
+        done = read_results(outfile)
+        todo = [i for i in indices if i not in done]
+        reps = dict((rec['canon'],rec) for rec in done.values()
+                    if 'canon' in rec and 'same_as' not in rec)
+        num_calculated = 0
+        drop_partial_line(outfile)
+        with open(outfile, 'a') as f:
+            def write(rec):
+                f.write(json.dumps(rec) + '\n')
+                f.flush()
+                if verbose:
+                    same = (f" (same as #{rec['same_as']})"
+                            if 'same_as' in rec else '')
+                    print(f"#{rec['index']} max Φ = {rec['max_phi']} "
+                          f"({len(rec['states'])} states){same}")
+            for b in range(0, len(todo), batch_size):
+                batch = []
+                nets = []
+                canons = dict() # d[index] = Canon
+                dups = [] # indices isomorphic to an earlier one
+                for i in todo[b:b+batch_size]:
+                    net = self.net(i)
+                    if dedup:
+                        canons[i] = cn.canonical_form(net)
+                        if canons[i].hash in reps:
+                            dups.append(i)
+                            continue
+                        reps[canons[i].hash] = i # record when calculated
+                    batch.append(i)
+                    nets.append(net)
+                jobs = []
+                pending = dict() # d[index] = num states not done
+                results = dict((i,{}) for i in batch)
+                for n,(i,net) in enumerate(zip(batch, nets)):
+                    codes = net.out_state_codes
+                    states = tb.decode_states(codes, net.spns).tolist()
+                    jobs.extend(((i,int(c)),n,state)
+                                for c,state in zip(codes, states))
+                    pending[i] = len(codes)
+                for (i,code),phi,secs,cpu in calculate_jobs(nets, jobs,
+                                                            workers=workers):
+                    results[i][code] = (phi, secs)
+                    pending[i] -= 1
+                    if pending[i] > 0:
+                        continue
+                    rec = record(i, self.assignment(i), results.pop(i),
+                                 canon=canons.get(i))
+                    if i in canons:
+                        reps[rec['canon']] = rec
+                    write(rec)
+                    num_calculated += 1
+                for i in dups:
+                    write(same_record(i, self.assignment(i),
+                                      reps[canons[i].hash], canons[i],
+                                      self.exp.net.spns))
+        return num_calculated
+
+
+def record(index, assignment, results, canon=None):
+    """Compact result of one assignment. RESULTS: d[stateCode]=(phi,secs)"""
+    codes = sorted(results)
+    phis = [results[c][0] for c in codes]
+    rec = dict(index=index,
+               funcs=list(assignment.values()),
+               states=codes,
+               phi=phis,
+               max_phi=max(phis),
+               elapsed_seconds=sum(results[c][1] for c in codes))
+    if canon is not None:
+        rec.update(canon=canon.hash, order=canon.order)
+    return rec
+
+def same_record(index, assignment, rep, canon, spns):
+    """Record of an assignment isomorphic to the one in record REP. Its
+    results are those of REP mapped to the states of this assignment."""
+    ccodes = cn.to_canonical_codes(rep['states'], spns, rep['order'])
+    codes = cn.from_canonical_codes(ccodes, spns, canon.order).tolist()
+    rec = record(index, assignment,
+                 dict((c,(phi,0.0)) for c,phi in zip(codes, rep['phi'])))
+    rec.update(same_as=rep['index'], canon=canon.hash)
+    return rec
+
+def read_results(outfile):
+    """RETURN: d[index] = record of assignments already in OUTFILE."""
+    done = dict()
+    if not os.path.exists(outfile):
+        return done
+    with open(outfile) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue # truncated by a killed run
+            done[rec['index']] = rec
+    return done
+
+##############################################################################
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=('Calculate phi over all reachable states for many '
+                     'assignments of funcs to the nodes of a net.'),
+        epilog='EXAMPLE: %(prog)s examples/suite1.json sweep.jsonl --sample 100'
+        )
+    parser.add_argument('net',
+                        help=('Net definition in JSON format containing '
+                              'at least "edges" key. Funcs are ignored.'))
+    parser.add_argument('outfile',
+                        help=('JSON Lines file to write (and resume) '
+                              'results in.'))
+    parser.add_argument('--all_funcs', action='store_true',
+                        help=('Use every binary func of the inputs of a node '
+                              'instead of only symmetric ones.'))
+    parser.add_argument('--sample', type=int,
+                        help='Number of random assignments to run.')
+    parser.add_argument('--seed', type=int,
+                        help='Random seed for --sample.')
+    parser.add_argument('--start', type=int, default=0,
+                        help='First assignment number to run.')
+    parser.add_argument('--stop', type=int,
+                        help='Stop before this assignment number.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=('Number of processes to calculate states in. '
+                              'Default runs serially.'))
+    parser.add_argument('--no_dedup', action='store_true',
+                        help=('Calculate every assignment, even those that '
+                              'give a net isomorphic to an earlier one.'))
+    args = parser.parse_args()
+
+    with open(args.net, 'r') as f:
+        jj = json.load(f)
+    sweep = Sweep(exp=experiment_from_json(dict(jj, funcs={})),
+                  all_funcs=args.all_funcs)
+    indices = sweep.indices(sample=args.sample, seed=args.seed,
+                            start=args.start, stop=args.stop)
+    timer = Timer()
+    timer.tic
+    num = sweep.run(args.outfile, indices=indices, workers=args.workers,
+                    dedup=not args.no_dedup)
+    print(f'Calculated {num} of {len(indices)} assignments '
+          f'(sweep size {len(sweep)}) in {timer.toc} seconds')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 """To use the graph DRAW methods, you must have graphviz installed.
 https://www.graphviz.org/
+
+Nets, TPMs and state graphs need only numpy and networkx.  pyphi, pandas
+and the drawing libraries are imported when first used (calculating
+phi, asking for a DataFrame, drawing) so tools that don't need them
+start fast.
 """
 # Python standard library
 from collections import Counter, defaultdict
@@ -7,17 +12,22 @@ import itertools
 from random import choice
 import subprocess
 import json
+import math
 import re
+import struct
+import sys
+import time
+import zipfile
 # External packages
 import networkx as nx
-from networkx.drawing.nx_pydot import write_dot,pydot_layout
-import pandas as pd
 import numpy as np
-import pyphi
-import pyphi.network
-from pyphi.convert import sbn2sbs, sbs2sbn, to_2d
 # Local packages
 import phial.node_functions as nf
+import phial.cache as pc
+import phial.gen_funcs as gf
+import phial.trace as tr
+from phial.analytics import FunctionalGraph, ChunkedStateGraph
+from phial.simulate import Simulator
 
 
 def nodes_state(state, nodelabels):
@@ -36,24 +46,171 @@ def all_states(N, spn=2, backwards=False):
     spn:: States Per Node
     """
     assert spn <= 16 # because we represent as hex string.
-    states = [''.join(f'{spn:x}' for spn in sv)
-              for sv in itertools.product(range(spn),repeat=N)]
+    return hexstrs(state_matrix([spn]*N, backwards=backwards))
+
+def state_matrix(spns, backwards=True):
+    """All system states as rows of an int ndarray; one column per node.
+    spns:: States Per Node for each node (in node order)
+    With 'backwards=True' (default) the first node changes fastest, which
+    is the row order of our TPMs (and of pyphi).  Otherwise lexigraphical.
+
+    >>> state_matrix([2,2]).tolist()
+    [[0, 0], [1, 0], [0, 1], [1, 1]]
+    >>> state_matrix([2,3], backwards=False).tolist()
+    [[0, 0], [0, 1], [0, 2], [1, 0], [1, 1], [1, 2]]
+    """
+    spns = np.asarray(spns, dtype=np.int64)
+    codes = np.arange(int(np.prod(spns)), dtype=np.int64)[:, None]
+    return (codes // radix_weights(spns, backwards=backwards)) % spns
+
+def radix_weights(spns, backwards=False):
+    """Place value of each node in a mixed-radix packed state.
+    Default is first node most significant (lexigraphical order).
+
+    >>> radix_weights([2,3,2]).tolist()
+    [6, 2, 1]
+    >>> radix_weights([2,3,2], backwards=True).tolist()
+    [1, 2, 6]
+    """
+    spns = np.asarray(spns, dtype=np.int64)
     if backwards:
-        states = sorted(states, key= lambda s: s[::-1])
-    return states
+        return np.cumprod(np.concatenate(([1], spns[:-1]))).astype(np.int64)
+    weights = np.ones(len(spns), dtype=np.int64)
+    weights[:-1] = np.cumprod(spns[:0:-1])[::-1]
+    return weights
+
+# A system state is packed into a single int (its "state code") with the
+# first node as the least significant digit.  That makes the code of a
+# state equal to its row number in our TPMs (and in pyphi TPMs).  Use
+# codes for computing.  Hex strings are for display and export.
+def encode_states(states, spns):
+    """State codes of rows of STATES (2D int ndarray, one column per node).
+    spns:: States Per Node for each node
+
+    >>> encode_states(np.array([[0,0,0],[1,0,0],[0,1,1]]), [2,2,2]).tolist()
+    [0, 1, 6]
+    """
+    return np.asarray(states, dtype=np.int64) @ radix_weights(spns, backwards=True)
+
+def decode_states(codes, spns):
+    """Rows of node states (2D int ndarray) for each of the state CODES.
+
+    >>> decode_states([0, 1, 6], [2,2,2]).tolist()
+    [[0, 0, 0], [1, 0, 0], [0, 1, 1]]
+    """
+    codes = np.asarray(codes, dtype=np.int64).reshape(-1, 1)
+    spns = np.asarray(spns, dtype=np.int64)
+    return (codes // radix_weights(spns, backwards=True)) % spns
+
+def codes_to_hexstrs(codes, spns):
+    """Convert state codes to list of statehexstr.
+
+    >>> codes_to_hexstrs([0, 1, 6], [2,2,2])
+    ['000', '100', '011']
+    """
+    return hexstrs(decode_states(codes, spns))
+
+def hexstrs_to_codes(statestrs, spns):
+    """Convert statehexstr (or list of them) to ndarray of state codes.
+    Raise ValueError for a string that is not one hex digit (less than
+    the num_states of its node) per node.
+
+    >>> hexstrs_to_codes(['000', '100', '011'], [2,2,2]).tolist()
+    [0, 1, 6]
+    """
+    if isinstance(statestrs, str):
+        statestrs = [statestrs]
+    statestrs = list(statestrs)
+    spns = np.asarray(spns, dtype=np.int64)
+    N = len(spns)
+    for s in statestrs:
+        if len(s) != N:
+            raise ValueError(f'State {s!r} is not one hex digit for each '
+                             f'of {N} nodes')
+    if N == 0:
+        return np.zeros(len(statestrs), dtype=np.int64)
+    # Unicode code points of the hex digits, one column per node
+    chars = np.array(statestrs, dtype=f'<U{N}').view(np.uint32)
+    states = chars.reshape(len(statestrs), N).astype(np.int64)
+    digit = (states >= ord('0')) & (states <= ord('9'))
+    lower = (states >= ord('a')) & (states <= ord('f'))
+    upper = (states >= ord('A')) & (states <= ord('F'))
+    states -= np.where(lower, ord('a') - 10,
+                       np.where(upper, ord('A') - 10, ord('0')))
+    bad = ~(digit | lower | upper) | (states >= spns)
+    if bad.any():
+        s = statestrs[int(np.flatnonzero(bad.any(axis=1))[0])]
+        raise ValueError(f'State {s!r} has a node state out of range for '
+                         f'nodes with {spns.tolist()} states')
+    return encode_states(states, spns)
+
+def lex_permutation(spns):
+    """State code of each state in lexigraphical order (i.e. the order of 
+    all_states(backwards=False)). Index by it to reorder a TPM from code 
+    (pyphi) order to lexigraphical order. np.argsort() of it goes the 
+    other way.
+
+    >>> lex_permutation([2,2,2]).tolist()
+    [0, 4, 2, 6, 1, 5, 3, 7]
+    """
+    return encode_states(state_matrix(spns, backwards=False), spns)
+
+def hexstrs(states):
+    """Convert rows of state_matrix() to list of statehexstr."""
+    states = np.asarray(states)
+    if states.shape[1] == 0:
+        return [''] * states.shape[0]
+    chars = np.array(list('0123456789abcdef'))[states]
+    return np.ascontiguousarray(chars).view(f'<U{states.shape[1]}').ravel().tolist()
+
+def state_dtype(spns):
+    """Smallest unsigned int dtype that holds the state of every node.
+
+    >>> state_dtype([2,2,2]), state_dtype([2,300])
+    (dtype('uint8'), dtype('uint16'))
+    """
+    return np.min_scalar_type(max(int(np.max(spns, initial=2)) - 1, 1))
+
+def pack_states(states, spns):
+    """Mixed-radix pack rows of STATES (2D int ndarray) into ints.
+    First column is most significant (lexigraphical order).
+    spns:: States Per Node for each column
+
+    >>> pack_states(np.array([[0,0],[0,2],[1,0],[1,2]]), [2,3]).tolist()
+    [0, 2, 3, 5]
+    """
+    return np.asarray(states, dtype=np.int64) @ radix_weights(spns)
+
+# Number of states (TPM rows) calc_tpm_array() and ChunkedStateGraph
+# work on at once.
+TPM_CHUNK = 2**16
 
 # NB: This does NOT hold the state of a node.  That would increase load
 # on processing multiple states -- each with its own set of nodes!
 # Instead, a statestr contains states for all nodes a specific time.
 #
-# Would this be light-weight enough 10^5++ nodes? @@@
+# The nodes of a Net live in the arrays of a NodeStore; a Node there is
+# only a view (made when asked for) so nets of 10^5++ nodes are cheap.
 #
+
+def compile_func(func, input_states):
+    """Truth table of FUNC as an ndarray indexed by the packed (see
+    pack_states) states of its inputs.
+    input_states:: tuple of num_states of each input"""
+    if isinstance(func, gf.BoolFunc) and input_states == (2,)*func.N:
+        return func.lut.astype(int)
+    inputs = state_matrix(input_states, backwards=False)
+    return np.array([func(sv) for sv in inputs.tolist()], dtype=int)
+
 # InstanceVars: id, label, num_states, func
 class Node():
     """Node in network. Supports more than just two states but downstream 
     software may be built for only binary nodes. Auto increment node id that 
     will be used as label if one isn't provided on creation.
+    Once part of a Net, num_states and func are held by its NodeStore.
     """
+    __slots__ = ('id', 'label', '_store', '_pos',
+                 '_num_states', '_func', '_lut', '_lut_key')
     _id = 0
 
     def __init__(self,label=None, num_states=2, id=None, func=nf.MJ_func):
@@ -62,8 +219,64 @@ class Node():
             Node._id += 1
         self.id = id
         self.label = label or id
+        self._store = None
+        self._pos = None
         self.num_states = num_states
         self.func = func 
+
+    @classmethod
+    def _view(cls, store, pos):
+        node = cls.__new__(cls)
+        node.id = int(store.ids[pos])
+        node.label = store.labels[pos]
+        node._store = store
+        node._pos = pos
+        return node
+
+    @property
+    def num_states(self):
+        if self._store is None:
+            return self._num_states
+        return int(self._store.spns[self._pos])
+
+    @num_states.setter
+    def num_states(self, num_states):
+        if self._store is None:
+            self._num_states = num_states
+        else:
+            self._store.set_num_states(self._pos, num_states)
+
+    @property
+    def func(self):
+        if self._store is None:
+            return self._func
+        return self._store.funcs[self._store.func_index[self._pos]]
+
+    @func.setter
+    def func(self, func):
+        if self._store is None:
+            self._func = func
+            self._lut = None # compiled func, see compile()
+            self._lut_key = None
+        else:
+            self._store.set_func(self._pos, func)
+
+    def compile(self, input_states):
+        """Truth table of func as an ndarray (cached until func or inputs
+        change).  Indexed by the packed (see pack_states) states of the 
+        inputs to func.
+        input_states:: num_states of each input (predecessor) in order
+
+        >>> Node(func=nf.XOR_func).compile((2,2)).tolist()
+        [0, 1, 1, 0]
+        """
+        input_states = tuple(int(s) for s in input_states)
+        if self._store is not None:
+            return self._store.compile(self._pos, input_states)
+        if self._lut is None or self._lut_key != input_states:
+            self._lut = compile_func(self.func, input_states)
+            self._lut_key = input_states
+        return self._lut
         
     def truth_table(self, max_inputs=4):
         """Full truth table for function associated with Node. Inputs consist
@@ -94,10 +307,163 @@ class Node():
     def __str__(self):
         return f'{self.label}({self.id}): {self.num_states},{self.func.__name__}'
 
+
+class NodeStore():
+    """Nodes of a Net held in arrays, in ID order (the order of the TPM
+    columns).
+    InstanceVars: ids, labels, spns, funcs, func_index, pred_ptr, pred_idx,
+    position
+    funcs is the table of distinct node funcs; func_index[i] is the
+    position in it of the func of node i.  The predecessors of node i are
+    pred_idx[pred_ptr[i]:pred_ptr[i+1]] (CSR, in ID order).  Node objects
+    are only made (as views of the arrays) when asked for.
+
+    Changes are tracked for the Net: dirty holds the positions of nodes
+    whose TPM column is stale (func or inputs changed), reshaped is set
+    when num_states changed (every column is stale) and version counts
+    changes of any kind.
+
+    >>> store = NodeStore([0,1,2], list('ABC'), [2,2,3], [nf.OR_func], [0,0,0],
+    ...                   src=[0,2,1,0], dst=[1,1,2,1])
+    >>> store.predecessors(1).tolist(), store.node(2).num_states
+    ([0, 2], 3)
+    """
+    def __init__(self, ids, labels, spns, funcs, func_index, src=(), dst=()):
+        """src, dst:: position of the tail and head of each edge"""
+        n = len(labels)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.labels = list(labels)
+        self.position = dict((l,i) for i,l in enumerate(self.labels))
+        self.spns = np.array(spns, dtype=np.int64)
+        self.funcs = list(funcs)
+        self._func_pos = dict((id(f),k) for k,f in enumerate(self.funcs))
+        self.func_index = np.array(func_index, dtype=np.int64)
+        # Sorted by head then tail. Duplicate edges count once.
+        arcs = np.unique(np.asarray(dst, dtype=np.int64) * n
+                         + np.asarray(src, dtype=np.int64))
+        self.pred_idx = arcs % max(n, 1)
+        self.pred_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(arcs // max(n, 1), minlength=n),
+                  out=self.pred_ptr[1:])
+        self._views = [None] * n
+        self._luts = dict() # d[(funcIndex, inputStates)] = compiled func
+        self.dirty = set()
+        self.reshaped = False
+        self.version = 0
+
+    @classmethod
+    def from_nodes(cls, nodes, edges):
+        """Store of NODES (which become views of it) and EDGES (node label
+        pairs)."""
+        nodes = sorted(nodes, key=lambda n: n.id)
+        funcs = []
+        func_pos = dict()
+        func_index = []
+        for n in nodes:
+            if id(n.func) not in func_pos:
+                func_pos[id(n.func)] = len(funcs)
+                funcs.append(n.func)
+            func_index.append(func_pos[id(n.func)])
+        position = dict((n.label,i) for i,n in enumerate(nodes))
+        edges = [(position[u],position[v]) for u,v in edges]
+        src,dst = zip(*edges) if edges else ((),())
+        store = cls([n.id for n in nodes], [n.label for n in nodes],
+                    [n.num_states for n in nodes], funcs, func_index,
+                    src, dst)
+        for i,n in enumerate(nodes):
+            n._store = store
+            n._pos = i
+            store._views[i] = n
+        return store
+
+    def __len__(self):
+        return len(self.labels)
+
+    def node(self, pos):
+        """Node (view) at position POS."""
+        node = self._views[pos]
+        if node is None:
+            node = self._views[pos] = Node._view(self, pos)
+        return node
+
+    @property
+    def nodes(self):
+        return [self.node(i) for i in range(len(self))]
+
+    def predecessors(self, pos):
+        """ndarray of positions of the predecessors of node POS."""
+        return self.pred_idx[self.pred_ptr[pos]:self.pred_ptr[pos+1]]
+
+    def set_func(self, pos, func):
+        k = self._func_pos.get(id(func))
+        if k is not None and k == self.func_index[pos]:
+            return
+        if k is None:
+            if len(self.funcs) > 2 * len(self) + 16:
+                self._compact()
+            k = self._func_pos[id(func)] = len(self.funcs)
+            self.funcs.append(func)
+        self.func_index[pos] = k
+        self.dirty.add(pos)
+        self.version += 1
+
+    def set_num_states(self, pos, num_states):
+        if num_states != self.spns[pos]:
+            self.spns[pos] = num_states
+            self.reshaped = True
+            self.version += 1
+
+    def set_predecessors(self, pos, preds):
+        """Make PREDS (positions, in ID order) the inputs of node POS."""
+        preds = np.asarray(preds, dtype=np.int64)
+        lo,hi = self.pred_ptr[pos],self.pred_ptr[pos+1]
+        self.pred_idx = np.concatenate((self.pred_idx[:lo], preds,
+                                        self.pred_idx[hi:]))
+        self.pred_ptr[pos+1:] += len(preds) - (hi - lo)
+        self.dirty.add(pos)
+        self.version += 1
+
+    def _compact(self):
+        """Drop funcs no node has any more (and their compiled tables)."""
+        used,self.func_index = np.unique(self.func_index, return_inverse=True)
+        self.funcs = [self.funcs[k] for k in used.tolist()]
+        self._func_pos = dict((id(f),k) for k,f in enumerate(self.funcs))
+        self._luts = dict()
+
+    def compile(self, pos, input_states):
+        """Truth table of the func of node POS (see Node.compile).  Shared
+        by all nodes with the same func and input states."""
+        key = (int(self.func_index[pos]), input_states)
+        lut = self._luts.get(key)
+        if lut is None:
+            lut = self._luts[key] = compile_func(self.funcs[key[0]],
+                                                 input_states)
+        return lut
+
     
 class Net():
     """Store everything needed to calculate phi.
-    InstanceVars: graph, node_lut, tpm
+    InstanceVars: graph, tpm_array
+
+    Nodes are held in a NodeStore (arrays in ID order).  Nodes with int
+    IDs under 62 are labelled from Net.nn, others n<id>.  Nodes can
+    instead be given (arbitrary string) labels as edge endpoints.
+
+    The State-by-Node TPM is held as tpm_array; a contiguous ndarray of
+    the smallest dtype that fits the node states (uint8 for binary nets).
+    Row number is state code (pyphi order).  It is calculated from the
+    node funcs on first use, so big nets are cheap until something needs
+    it.  The labelled DataFrame (tpm) is only built when asked for.
+
+    graph (networkx DiGraph) is for reading.  Change edges with add_edge()
+    and remove_edge(), or call index_nodes() after editing graph directly;
+    the NodeStore (not graph) is what the TPM is calculated from.  A graph
+    with a different number of edges than the NodeStore is re-indexed
+    before calculating the TPM, but other direct edits are not noticed.
+
+    >>> net = Net(edges=[('in', 'out'), ('out', 'in'), ('in', 'in')])
+    >>> net.node_labels, net.predecessor_indices(net.get_node('in'))
+    (['in', 'out'], [0, 1])
     """
 
     nn = list('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789')
@@ -111,74 +477,252 @@ class Net():
                  title = None, # Label for graph
                  func = nf.MJ_func, # default mechanism for all nodes
                  ):
-        G = nx.DiGraph()
         if edges is None:
-            n_list = range(N)
+            edges = []
+            ids = list(range(N))
+            labels = [Net.default_label(i) for i in ids]
         else:
-            i,j = zip(*edges)
-            maxid = max(i+j)
-            n_list = sorted(set(i+j))
-        edgesStrP = type(n_list[0]) == str
-        if edgesStrP:
-            n_list = [(ord(l) - ord('A')) for l in n_list]
-        nodes = [Node(id=i, label=Net.nn[i], num_states=SpN, func=func)
-                 for i in n_list]
-
-        # lut[label] -> Node
-        self.node_lut = dict((n.label,n) for n in nodes)
-        #invlut[i] -> label
-        invlut = dict(((n.id,n.label) for n in self.node_lut.values())) 
-            
-        G.add_nodes_from(self.node_lut.keys())
-        if edges is not None:
-            if edgesStrP:
-                G.add_edges_from(edges)
+            edges = list(edges)
+            endpoints = sorted(set(itertools.chain.from_iterable(edges)))
+            if isinstance(endpoints[0], str):
+                labels = endpoints
+                nnpos = dict((l,i) for i,l in enumerate(Net.nn))
+                if all(l in nnpos for l in labels):
+                    ids = [nnpos[l] for l in labels]
+                    labels = sorted(labels, key=nnpos.get)
+                    ids.sort()
+                else:
+                    ids = list(range(len(labels)))
             else:
-                G.add_edges_from([(invlut[i],invlut[j]) for (i,j) in edges])
+                ids = endpoints
+                labels = [Net.default_label(i) for i in ids]
+        position = dict((l,i) for i,l in enumerate(labels))
+        if edges and not isinstance(edges[0][0], str):
+            position = dict((nid,i) for i,nid in enumerate(ids))
+        src = np.fromiter((position[u] for u,v in edges), dtype=np.int64,
+                          count=len(edges))
+        dst = np.fromiter((position[v] for u,v in edges), dtype=np.int64,
+                          count=len(edges))
+        self._store = NodeStore(ids, labels, np.full(len(ids), SpN), [func],
+                                np.zeros(len(ids), dtype=np.int64), src, dst)
+
+        G = nx.DiGraph()
+        G.add_nodes_from(labels)
+        G.add_edges_from(zip([labels[i] for i in src.tolist()],
+                             [labels[i] for i in dst.tolist()]))
         self.graph = G
         self.graph.name = title
+        self._tpm_df = None
+        self._tpm_array = None
+        if tpm is not None:
+            self.tpm = tpm
+
+    @staticmethod
+    def default_label(id):
+        """Label of node ID when none is given."""
+        return Net.nn[id] if 0 <= id < len(Net.nn) else f'n{id}'
+
+    @property
+    def tpm_array(self):
+        """Calculated from node funcs when first used.  After funcs or
+        edges change only the columns of the nodes affected are (see
+        update_tpm)."""
+        store = self._store
+        recalc = self._tpm_array is None or store.reshaped or store.dirty
+        if recalc and self._graph_edited():
+            self.index_nodes()
+            store = self._store
+        if self._tpm_array is None or store.reshaped:
+            tpm = self.calc_tpm_array()
+            store.dirty.clear()
+            store.reshaped = False
+            self._tpm_array = tpm
+        elif store.dirty:
+            self.update_tpm()
+        return self._tpm_array
+
+    @tpm_array.setter
+    def tpm_array(self, tpm):
+        """None to calculate it again from the node funcs when next used.
+        A TPM set here stands until node funcs or edges change."""
+        self._tpm_array = tpm
+        self._store.dirty.clear()
+        self._store.reshaped = False
+
+    def update_tpm(self):
+        """Recalculate only the TPM columns of nodes whose func or inputs
+        changed.  If any column differs the TPM is replaced by a copy with
+        the new columns (arrays already handed out never change) and the
+        cached successor codes are patched, not recalculated.  Otherwise
+        the TPM, and all that is cached from it, stays.
+        RETURN: tpm_array
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> tpm = net.tpm_array
+        >>> net.get_node('C').func = nf.OR_func
+        >>> net.tpm_array is tpm, bool((net.tpm_array == net.calc_tpm_array()).all())
+        (False, True)
+        >>> tpm = net.tpm_array
+        >>> net.get_node('A').func = nf.AND_func   # same table on 1 input
+        >>> net.tpm_array is tpm
+        True
+        """
+        store = self._store
+        old = self._tpm_array
+        cols = sorted(store.dirty)
+        with tr.span('update_tpm', columns=len(cols)):
+            new = self.calc_tpm_array(columns=cols)
+            store.dirty.clear()
+            changed = [k for k,c in enumerate(cols)
+                       if not np.array_equal(old[:,c], new[:,k])]
+            if not changed:
+                return old
+            tpm = np.array(old)
+            for k in changed:
+                tpm[:,cols[k]] = new[:,k]
+            cached = getattr(self, '_successors', None)
+            if cached is not None and cached[0] is old:
+                weights = radix_weights(self.spns, backwards=True)
+                succ = cached[1].copy()
+                for k in changed:
+                    c = cols[k]
+                    succ += (new[:,k].astype(np.int64) - old[:,c]) * weights[c]
+                self._successors = (tpm, succ)
+            self._tpm_array = tpm
+        return tpm
+
+    @property
+    def tpm(self):
+        """State-by-Node TPM as a DataFrame; index is statehexstr (in
+        backwards order), columns are node labels.  A new DataFrame over a
+        read only view of tpm_array each time (the index is built once).
+        Prefer tpm_array for computing.  To change the TPM, edit a copy and
+        set it: net.tpm = df
+
+        >>> net = Net(edges=[(0,1),(1,0)], func=nf.XOR_func)
+        >>> df = net.tpm.copy()
+        >>> df.loc['00'] = [1, 1]
+        >>> net.tpm = df
+        >>> net.tpm_array[0].tolist()
+        [1, 1]
+        """
+        import pandas as pd
+        tpm = self.tpm_array
+        cached = getattr(self, '_tpm_df', None) # (spns, index)
+        if cached is None or not np.array_equal(cached[0], self.spns):
+            cached = (self.spns.copy(),
+                      pd.Index(codes_to_hexstrs(np.arange(len(tpm)),
+                                                self.spns)))
+            self._tpm_df = cached
+        arr = tpm.view()
+        arr.flags.writeable = False
+        return pd.DataFrame(arr, index=cached[1], copy=False,
+                            columns=[n.label for n in self.nodes])
+
+    @tpm.setter
+    def tpm(self, tpm):
+        """TPM:: State-by-Node ndarray with rows in state code order or
+        DataFrame indexed by statehexstr (any row order).  ValueError
+        unless it has a row for every state, a column for every node and
+        each value is a state of its node (or a probability).
+
+        >>> Net(edges=[(0,1),(1,0)], tpm=np.zeros((8,2)))
+        Traceback (most recent call last):
+        ...
+        ValueError: TPM of shape (8, 2) is not State-by-Node for 2 nodes with [2, 2] states
+        """
         if tpm is None:
-            self.tpm = self.calc_tpm()
-        else:
-            allstates = all_states(len(self.graph), backwards=True)
-            allnodes = [n.label for n in nodes]
-            self.tpm = pd.DataFrame(tpm, index=allstates, columns=allnodes)
-            
-            
+            self.tpm_array = None
+            return
+        spns = self.spns
+        shape = (math.prod(spns.tolist()), len(spns))
+        if _is_dataframe(tpm):
+            codes = hexstrs_to_codes(list(tpm.index), spns)
+            if len(np.unique(codes)) != len(codes):
+                raise ValueError('TPM has more than one row for a state')
+            if len(codes) != shape[0]:
+                raise ValueError(f'TPM has {len(codes)} rows; '
+                                 f'not one for each of {shape[0]} states')
+            rows = np.empty((shape[0], tpm.shape[1]), dtype=object)
+            rows[codes] = tpm.to_numpy()
+            tpm = rows
+        tpm = np.asarray(tpm)
+        if tpm.shape != shape:
+            raise ValueError(f'TPM of shape {tpm.shape} is not State-by-Node '
+                             f'for {len(spns)} nodes with {spns.tolist()} '
+                             'states')
+        values = tpm.astype(float)
+        if np.array_equal(values, np.round(values)):
+            dtype = state_dtype(spns)
+            top = spns - 1
+        else: # probabilistic
+            dtype = np.float64
+            top = 1
+        if not ((0 <= values) & (values <= top)).all():
+            raise ValueError('TPM has a value that is not a state (or '
+                             'probability) of its node')
+        self.tpm_array = np.ascontiguousarray(tpm, dtype=dtype)
+
     @property
     def state_graph(self):
-        G = nx.DiGraph(sbn2sbs(self.tpm))
-        mapping = dict(zip(range(len(self.tpm.index)), self.tpm.index))
-        S = nx.relabel_nodes(G, mapping)
+        """Networkx DiGraph of state to state transitions (statehexstr)."""
+        labels = codes_to_hexstrs(np.arange(len(self.tpm_array)), self.spns)
+        S = nx.DiGraph()
+        S.add_nodes_from(labels)
+        S.add_edges_from((labels[i],labels[j])
+                         for i,j in self.analytics.edges())
         return S
 
+    @property
+    def successor_codes(self):
+        """succ[code] is the code of the state that follows state CODE.
+        Cached until tpm is replaced (and patched by update_tpm)."""
+        cached = getattr(self, '_successors', None)
+        tpm = self.tpm_array
+        if cached is None or cached[0] is not tpm:
+            cached = (tpm, encode_states(tpm, self.spns))
+            self._successors = cached
+        return cached[1]
+
+    @property
+    def analytics(self):
+        """FunctionalGraph of state to state transitions. Attractors,
+        basins, etc.  Cached until tpm is replaced."""
+        cached = getattr(self, '_analytics', None)
+        tpm = self.tpm_array
+        if cached is None or cached[0] is not tpm:
+            if tpm.dtype.kind == 'f':
+                raise ValueError('State graph analytics need a deterministic TPM')
+            with tr.span('analytics'):
+                cached = (tpm, FunctionalGraph(self.successor_codes))
+            self._analytics = cached
+        return cached[1]
+
     def from_json(self, jsonstr,
                   func = nf.MJ_func, # default mechanism for all nodes
                   SpN=2):
-        self.graph = self.node_lut = self.tpm = None
+        """Load net written by to_json() (overwrite existing data).
+        Linear in the number of states."""
+        self._tpm_df = None
+        self._tpm_array = None
         jdict = json.loads(jsonstr)
-        edges = jdict.get('edges',[])
-        i,j = zip(*edges)
-        n_list = sorted(set(i+j))
+        edges = [tuple(e) for e in jdict.get('edges',[])]
         nodes = [Node(**nd) for nd in jdict.get('nodes',[])]
         for n in nodes:
             n.func = nf.funcLUT[n.func]
         
         self.graph = nx.DiGraph(edges)
-        self.node_lut = dict((n.label,n) for n in nodes)
-
-        S = nx.DiGraph(jdict.get('tpm',[]))
-        #self.tpm = sbs2sbn(nx.to_pandas_adjacency(S))
-        s2s_df = nx.to_pandas_adjacency(S)
-        df = pd.DataFrame(index=s2s_df.index, columns=self.node_lut.keys())
-        for istate in s2s_df.index:
-            for outstate in s2s_df.columns:
-                if s2s_df.loc[istate,outstate] == 0:
-                    continue
-                ns = nodes_state(outstate,self.node_lut.keys())
-                print(f'DBG: istate={istate} ns={ns}')
-                df.loc[istate] = list(ns.values())
-        self.tpm = df
+        self._store = NodeStore.from_nodes(nodes, edges)
+
+        # State graph edges are (instatehexstr, outstatehexstr)
+        transitions = jdict.get('tpm',[])
+        spns = self.spns
+        tpm = np.zeros((int(np.prod(spns)), len(spns)), dtype=state_dtype(spns))
+        if transitions:
+            instates,outstates = zip(*transitions)
+            tpm[hexstrs_to_codes(instates, spns)] = decode_states(
+                hexstrs_to_codes(outstates, spns), spns)
+        self.tpm_array = tpm
 
     def to_json(self):
         S = self.state_graph
@@ -194,6 +738,189 @@ class Net():
         )
         return json.dumps(jj)
 
+    def copy(self, title=None):
+        """Net with the same nodes (num_states and funcs), edges and TPM.
+        Later changes to one do not change the other.
+
+        >>> net = Net(edges=[(0,1),(1,0)], func=nf.OR_func)
+        >>> net.get_node('B').num_states = 3
+        >>> net2 = net.copy()
+        >>> net.get_node('A').func = nf.AND_func
+        >>> net2.spns.tolist(), net2.nodes[0].func.__name__, net2.tpm_array.shape
+        ([2, 3], 'OR_func', (6, 2))
+        """
+        nodes = [Node(label=n.label, id=n.id, num_states=n.num_states,
+                      func=n.func)
+                 for n in self.nodes]
+        net = Net._from_parts(nodes, list(self.graph.edges),
+                              graph_nodes=list(self.graph.nodes),
+                              title=self.graph.name if title is None else title)
+        net.tpm_array = self.tpm_array
+        return net
+
+    def save(self, filename, compress=False):
+        """Write net to FILENAME in numpy .npz format.  Holds the TPM (as
+        tpm_array), graph, nodes and the truth table of each node's func.
+        Faster and much smaller than to_json().  Load with Net.load().
+        compress:: Zip compress the arrays. Smaller, but the TPM can't be
+           memory-mapped by load()."""
+        nodes = self.nodes
+        position = dict((l,i) for i,l in enumerate(self.graph.nodes))
+        luts = [self.func_lut(n) for n in nodes]
+        meta = dict(
+            version = 1,
+            title = self.graph.name,
+            graph_nodes = list(self.graph.nodes),
+            nodes = [dict(label=n.label,
+                          id=n.id,
+                          num_states=n.num_states,
+                          func=n.func.__name__)
+                     for n in nodes],
+        )
+        arrays = dict(
+            meta = np.array(json.dumps(meta)),
+            tpm = self.tpm_array,
+            edges = np.array([(position[u],position[v])
+                              for u,v in self.graph.edges],
+                             dtype=np.int64).reshape(-1, 2),
+            luts = np.concatenate(luts + [np.zeros(0, dtype=int)]),
+            lut_offsets = np.cumsum([0] + [len(lut) for lut in luts]),
+        )
+        with open(filename, 'wb') as f:
+            (np.savez_compressed if compress else np.savez)(f, **arrays)
+        return filename
+
+    @classmethod
+    def load(cls, filename, mmap_mode=None):
+        """Read net written by save().
+        mmap_mode:: Memory-map the TPM instead of reading it (see np.load).
+           'r' for read only.  Needs an uncompressed file.
+
+        >>> import tempfile, os
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     fname = net.save(os.path.join(d, 'net.npz'))
+        ...     net2 = Net.load(fname, mmap_mode='r')
+        ...     same = bool((net2.tpm_array == net.tpm_array).all())
+        >>> same, list(net2.graph.edges) == list(net.graph.edges)
+        (True, True)
+        """
+        with np.load(filename) as data:
+            meta = json.loads(data['meta'].item())
+            edges = data['edges']
+            luts = data['luts']
+            offsets = data['lut_offsets']
+            tpm = None if mmap_mode else data['tpm']
+        if tpm is None:
+            tpm = _npz_memmap(filename, 'tpm', mode=mmap_mode)
+
+        nodes = [Node(label=_label(nd['label']), id=nd['id'],
+                      num_states=nd['num_states'])
+                 for nd in meta['nodes']]
+        graph_nodes = [_label(l) for l in meta['graph_nodes']]
+        net = cls._from_parts(nodes,
+                              [(graph_nodes[u],graph_nodes[v])
+                               for u,v in edges.tolist()],
+                              graph_nodes=graph_nodes, title=meta['title'])
+        for k,(n,nd) in enumerate(zip(nodes, meta['nodes'])):
+            inputs = net.spns[net.predecessor_indices(n)].tolist()
+            n.func = _lut_func(luts[offsets[k]:offsets[k+1]], inputs,
+                               nd['func'])
+        net.tpm_array = tpm
+        return net
+
+    @classmethod
+    def _from_parts(cls, nodes, edges, graph_nodes=None, title=None):
+        """Net of NODES and EDGES (node label pairs) without a TPM."""
+        net = cls.__new__(cls)
+        net._tpm_df = None
+        net._tpm_array = None
+        net.graph = nx.DiGraph()
+        net.graph.add_nodes_from(graph_nodes or [n.label for n in nodes])
+        net.graph.add_edges_from(edges)
+        net.graph.name = title
+        net._store = NodeStore.from_nodes(nodes, net.graph.edges)
+        return net
+
+    @classmethod
+    def from_tpm_array(cls, tpm, cm=None, labels=None, spns=None,
+                       order='pyphi', title=None):
+        """Net with a precomputed TPM (not calculated from node funcs).
+        tpm:: State-by-Node (2D, or multidimensional as pyphi uses) or
+           State-by-State ndarray.  Square TPMs are State-by-State unless
+           CM, LABELS or SPNS say there are as many nodes as states.
+        cm:: Connectivity matrix; cm[i][j] for edge from node i to j.
+           Default: fully connected.
+        labels:: Node labels. Default: A, B, C, ...
+        spns:: States Per Node. Default: all binary.
+        order:: Order of the TPM rows; 'pyphi' (first node changes fastest)
+           or 'lex' (lexigraphical, last node changes fastest).
+        For a deterministic TPM each node gets a func with the truth table
+        it has in the TPM.
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> net2 = Net.from_tpm_array(net.tpm_array, cm=net.cm)
+        >>> bool((net2.tpm_array == net.tpm_array).all()), net2.nodes[2].func([1,0])
+        (True, 1)
+        >>> sbs = np.eye(4)[[0, 2, 1, 3]]  # swap the state of 2 nodes
+        >>> Net.from_tpm_array(sbs).tpm_array.tolist()
+        [[0, 0], [0, 1], [1, 0], [1, 1]]
+        """
+        tpm = np.asarray(tpm)
+        if tpm.ndim > 2:
+            from pyphi.convert import to_2d
+            tpm = to_2d(tpm)
+        num_nodes = next((len(x) for x in (cm, labels, spns) if x is not None),
+                         None)
+        sbs = (tpm.shape[0] == tpm.shape[1]
+               and (num_nodes is None or num_nodes != tpm.shape[1]))
+        if num_nodes is None:
+            num_nodes = (len(tpm) - 1).bit_length() if sbs else tpm.shape[1]
+        spns = np.array([2]*num_nodes if spns is None else spns, dtype=np.int64)
+        if len(tpm) != np.prod(spns):
+            raise ValueError(f'TPM with {len(tpm)} states does not fit '
+                             f'nodes with {spns.tolist()} states')
+        if order == 'lex':
+            inverse = np.argsort(lex_permutation(spns))
+            tpm = tpm[inverse]
+            if sbs: # columns are states too
+                tpm = tpm[:, inverse]
+        elif order != 'pyphi':
+            raise ValueError(f'Unknown TPM order {order!r}')
+        if sbs:
+            if np.array_equal(tpm, tpm.astype(bool)):
+                tpm = decode_states(tpm.argmax(axis=1), spns)
+            else:
+                from pyphi.convert import sbs2sbn
+                tpm = sbs2sbn(tpm)
+
+        labels = list(Net.nn[:num_nodes] if labels is None else labels)
+        cm = np.ones((num_nodes, num_nodes)) if cm is None else np.asarray(cm)
+        nodes = [Node(label=labels[i], id=i, num_states=int(spns[i]))
+                 for i in range(num_nodes)]
+        net = cls._from_parts(nodes,
+                              [(labels[i],labels[j])
+                               for i,j in zip(*np.nonzero(cm))],
+                              title=title)
+        net.tpm = tpm
+        if net.tpm_array.dtype.kind != 'f':
+            weights = radix_weights(spns, backwards=True)
+            for i,node in enumerate(nodes):
+                preds = net.predecessor_indices(node)
+                inputs = state_matrix(spns[preds], backwards=False)
+                table = net.tpm_array[inputs @ weights[preds], i]
+                node.func = _lut_func(table, spns[preds].tolist(), 'TPM')
+            net._store.dirty.clear() # funcs give the TPM we have
+        return net
+
+    @classmethod
+    def from_pyphi(cls, network, title=None):
+        """Net of pyphi NETWORK (its TPM, cm and node labels)."""
+        from pyphi.convert import to_2d
+        return cls.from_tpm_array(to_2d(network.tpm), cm=network.cm,
+                                  labels=list(network.node_labels),
+                                  title=title)
+
     def info(self):
         dd = dict(
             edges=list(self.graph.edges),
@@ -201,37 +928,83 @@ class Net():
             num_in_states=len(self.in_states),
             num_unreachable_states=len(self.unreachable_states),
             num_state_cc = self.state_cc,
-            num_state_cycles = len(list(self.state_cycles))
+            num_state_cycles = len(self.state_cycles),
+            **self.analytics.summary()
         )
         return dd
         
     @property
     def state_cc(self):
         """Number of connected components in state to state graph."""
-        S = nx.DiGraph(sbn2sbs(self.tpm))
-        return nx.number_weakly_connected_components(S)
+        return self.analytics.num_components
 
     @property
     def state_cycles(self):
-        """Cycles found in state to state graph."""
-        S = nx.DiGraph(sbn2sbs(self.tpm))
-        return nx.simple_cycles(S)
+        """Cycles found in state to state graph. Each is a list of state
+        codes (TPM row numbers) in transition order."""
+        return self.analytics.cycles
         
     def node_state_counts(self, node):
         """Truth table of node.func run over all possible inputs.
         Inputs are predecessor nodes with all possible states."""
-        preds = (self.get_node(l)
-                 for l in set(self.graph.predecessors(node.label)))
         counter = Counter()
-        counter.update(node.func(sv)
-                       for sv in itertools.product(*[n.states for n in preds]))
+        counter.update(self.func_lut(node).tolist())
         return counter
 
     def eval_node(self, node, system_state_tup):
-        preds_id = set([self.get_node(l).id
-                    for l in set(self.graph.predecessors(node.label))])
-        args = [system_state_tup[i] for i in preds_id]
+        args = [system_state_tup[i] for i in self.predecessor_indices(node)]
         return node.func(args)
+
+    def func_lut(self, node):
+        """Compiled truth table of node.func given its predecessors here.
+        See Node.compile()"""
+        preds = self._store.predecessors(self._store.position[node.label])
+        return node.compile(self._store.spns[preds].tolist())
+
+    def packed_inputs(self, node, states):
+        """Packed states of the predecessors of NODE for each row of STATES
+        (2D int ndarray, one column per node). Use to index func_lut(node)."""
+        cols = self._store.predecessors(self._store.position[node.label])
+        return pack_states(states[:,cols], self._store.spns[cols])
+
+    def predecessor_indices(self, node):
+        """Column (position in self.nodes) of each predecessor of NODE.
+        In ID order; which is the order node funcs get their inputs."""
+        return self._store.predecessors(
+            self._store.position[node.label]).tolist()
+
+    def add_edge(self, u, v):
+        """Add edge from node U to node V (labels of nodes in this net).
+        Only the TPM column of V is recalculated (when next used)."""
+        store = self._store
+        pu,pv = store.position[u],store.position[v]
+        self.graph.add_edge(u, v)
+        store.set_predecessors(pv, np.union1d(store.predecessors(pv), [pu]))
+
+    def remove_edge(self, u, v):
+        """Remove edge from node U to node V.  Only the TPM column of V is
+        recalculated (when next used)."""
+        store = self._store
+        pu,pv = store.position[u],store.position[v]
+        self.graph.remove_edge(u, v)
+        store.set_predecessors(pv, np.setdiff1d(store.predecessors(pv), [pu]))
+
+    def _graph_edited(self):
+        """True if self.graph was edited directly (so the NodeStore has a
+        different number of edges)."""
+        return self.graph.number_of_edges() != len(self._store.pred_idx)
+
+    def index_nodes(self):
+        """Rebuild the NodeStore from self.graph.  Call after editing the
+        graph directly."""
+        nodes = self.nodes
+        known = set(n.label for n in nodes)
+        next_id = int(self._store.ids.max(initial=-1)) + 1
+        nodes += [Node(label=l, id=next_id + k)
+                  for k,l in enumerate(l for l in self.graph if l not in known)]
+        self._store = NodeStore.from_nodes(
+            [n for n in nodes if n.label in self.graph], self.graph.edges)
+        self._tpm_array = None
         
 
     def node_pd(self, node):
@@ -243,19 +1016,173 @@ class Net():
         return [counts[i]/total for i in node.states]
 
     def calc_tpm(self):
+        """Calculate State-by-Node TPM using node funcs. Allows non-binary.
+        RETURN: DataFrame; index is statehexstr, in the same (backwards)
+        order as calc_tpm_reference().
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> bool((net.calc_tpm().values == net.calc_tpm_reference().values).all())
+        True
+        """
+        import pandas as pd
+        nodes = self.nodes
+        return pd.DataFrame(self.calc_tpm_array(),
+                            index=hexstrs(state_matrix(self.spns)),
+                            columns=[n.label for n in nodes])
+
+    def calc_tpm_array(self, out=None, chunk_size=TPM_CHUNK, columns=None):
+        """Calculate State-by-Node TPM using node funcs. Allows non-binary.
+        States are generated CHUNK_SIZE at a time (only the states of
+        nodes that are inputs) and each node column is looked up in the
+        compiled truth table of its func (see func_lut).
+        out:: array (e.g. np.memmap) to write the TPM into.
+        columns:: Calculate only these columns (node positions).
+        RETURN: ndarray (dtype from state_dtype); row number is state code.
+        """
+        if columns is None and self._graph_edited():
+            self.index_nodes()
+        store = self._store
+        spns = self.spns
+        cols = list(range(len(store)) if columns is None else columns)
+        num = math.prod(spns.tolist())
+        if num > np.iinfo(np.int64).max:
+            raise ValueError(f'Net of {len(store)} nodes has too many states '
+                             'for a TPM')
+        if out is None:
+            out = np.empty((num, len(cols)), dtype=state_dtype(spns))
+        with tr.span('calc_tpm', num_states=num, columns=len(cols)):
+            preds = [store.predecessors(c) for c in cols]
+            luts = [store.compile(c, tuple(spns[p].tolist()))
+                    for c,p in zip(cols, preds)]
+            inputs = np.unique(np.concatenate(preds + [np.zeros(0, dtype=int)]))
+            where = [np.searchsorted(inputs, p) for p in preds]
+            pack = [radix_weights(spns[p]) for p in preds]
+            weights = radix_weights(spns, backwards=True)[inputs]
+            for start in range(0, num, chunk_size):
+                stop = min(start + chunk_size, num)
+                states = (np.arange(start, stop)[:,None] // weights) % spns[inputs]
+                for k in range(len(cols)):
+                    out[start:stop,k] = luts[k][states[:,where[k]] @ pack[k]]
+        return out
+
+    def build_tpm_file(self, filename, chunk_size=TPM_CHUNK):
+        """Calculate TPM into .npy file FILENAME a chunk at a time (so it
+        never has to fit in memory) and use it (see use_tpm_file)."""
+        spns = self.spns
+        tpm = np.lib.format.open_memmap(filename, mode='w+',
+                                        dtype=state_dtype(spns),
+                                        shape=(int(np.prod(spns)), len(spns)))
+        self.calc_tpm_array(out=tpm, chunk_size=chunk_size)
+        tpm.flush()
+        del tpm
+        return self.use_tpm_file(filename)
+
+    def use_tpm_file(self, filename):
+        """Memory-map the TPM in .npy file FILENAME (read only) as
+        tpm_array.  Any number of processes can map the same file without
+        copying it."""
+        tpm = np.load(filename, mmap_mode='r')
+        if tpm.shape != (int(np.prod(self.spns)), len(self.spns)):
+            raise ValueError(f'TPM in {filename} of shape {tpm.shape} does '
+                             'not fit this net')
+        self.tpm_array = tpm
+        return tpm
+
+    def chunked_analytics(self, chunk_size=TPM_CHUNK):
+        """ChunkedStateGraph of the TPM. Attractors, unreachable states and
+        sampled basins of nets too big for analytics."""
+        return ChunkedStateGraph(self.tpm_array, self.spns, chunk_size)
+
+    @property
+    def simulator(self):
+        """Simulator of the node funcs; steps batches of states without
+        the TPM (see phial.simulate).  Rebuilt when funcs or num_states
+        change."""
+        store = self._store
+        key = (store, store.version)
+        cached = getattr(self, '_simulator', None)
+        if cached is None or cached[0] != key:
+            luts = [store.compile(i, tuple(store.spns[store.predecessors(i)]
+                                           .tolist()))
+                    for i in range(len(store))]
+            cached = (key, Simulator(store.spns, store.pred_ptr,
+                                     store.pred_idx, luts))
+            self._simulator = cached
+        return cached[1]
+
+    def _sim_states(self, states, seed=None):
+        """STATES as rows of node states; a number means that many random
+        states."""
+        if np.ndim(states) == 0:
+            return self.simulator.random_states(int(states), seed)
+        return np.asarray(states)
+
+    def simulate(self, states=1000, steps=1, noise=0.0, seed=None,
+                 record=False):
+        """Advance a batch of states STEPS steps using the node funcs (as
+        eval_node does).  No TPM needed, so works for big nets.
+        states:: Number of random states or 2D array of node states (one
+           row per state).
+        noise:: Probability of each node going to a different state than
+           its func gives.
+        RETURN: final states (2D ndarray) or, if RECORD, all of them (3D;
+        step, state, node).
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> bool((net.simulate(state_matrix(net.spns)) == net.tpm_array).all())
+        True
+        """
+        rng = np.random.default_rng(seed)
+        states = self._sim_states(states, rng)
+        with tr.span('simulate', num_states=len(states), steps=steps):
+            return self.simulator.run(states, steps, noise=noise, seed=rng,
+                                      record=record)
+
+    def find_attractors(self, states=1000, max_steps=1000, seed=None):
+        """Run a batch of states to their attractors without the TPM.
+        Attractor counts estimate the relative basin sizes.
+        states:: Number of random states or 2D array of node states.
+        RETURN: dict of ndarrays; states, transient (steps to reach the
+        attractor), period, attractor (index into attractors) and
+        attractors (smallest state on each).  -1 for trajectories with
+        no cycle found in MAX_STEPS.
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0),(0,2)], func=nf.XOR_func)
+        >>> res = net.find_attractors(state_matrix(net.spns))
+        >>> fg = net.analytics
+        >>> bool((res['transient'] == fg.depth).all())
+        True
+        >>> bool((res['period'] == fg.cycle_lengths[fg.attractor]).all())
+        True
+        """
+        states = self._sim_states(states, seed)
+        with tr.span('find_attractors', num_states=len(states)):
+            res = self.simulator.attractors(states, max_steps=max_steps)
+        res['states'] = states
+        return res
+
+    def sample_out_states(self, num=10000, seed=None):
+        """Output states (statehexstr, see out_states) of NUM random
+        states.  A subset of out_states found without the TPM."""
+        return set(hexstrs(self.simulator.sample_successors(num, seed)))
+
+    def calc_tpm_reference(self):
         """Iterate over all possible states(!!!) using node funcs
-        to calculate output state. State-to-State form. Allows non-binary"""
+        to calculate output state. State-to-State form. Allows non-binary.
+        Slow. Kept as the reference to check calc_tpm() against."""
+        import pandas as pd
         backwards=True  # I hate the order the papers use!!
-        allstates = list(itertools.product(*[n.states for n in self.nodes]))
-        N = len(self.nodes)
+        nodes = self.nodes
+        allstates = list(itertools.product(*[n.states for n in nodes]))
+        N = len(nodes)
         allstatesstr = [''.join([f'{s:x}' for s in sv]) for sv in allstates]
         df = pd.DataFrame(index=allstatesstr,
-                          columns=[n.label for n in self.nodes]).fillna(0)
+                          columns=[n.label for n in nodes]).fillna(0)
         
         for sv in allstates:
             s0 = ''.join(f'{s:x}' for s in sv)
             for i in range(N):
-                node = self.nodes[i]
+                node = nodes[i]
                 nodestate = self.eval_node(node,sv)
                 df.loc[s0,node.label] =  nodestate
 
@@ -264,21 +1191,66 @@ class Net():
             return df.reindex(index=newindex)
         return df.astype(int)
 
+    @property
+    def spns(self):
+        """States Per Node (read only ndarray) in node order."""
+        spns = self._store.spns.view()
+        spns.flags.writeable = False
+        return spns
+
+    @property
+    def out_state_codes(self):
+        """Sorted ndarray of state codes of the output states of TPM."""
+        return np.unique(self.successor_codes)
+
     @property
     def out_states(self):
         """Output states of TPM in hexstr form. These are the states allowed
         for the 'statestr' phi method.
         Otherwise the error 'cannot be reached in the given TPM' is thrown."""
-        return set(''.join(f'{int(s):x}' for s in self.tpm.iloc[i])
-                   for i in range(self.tpm.shape[0]))
+        return set(codes_to_hexstrs(self.out_state_codes, self.spns))
+
     @property
     def in_states(self):
-        return self.tpm.index
+        return codes_to_hexstrs(np.arange(len(self.tpm_array)), self.spns)
+
+    @property
+    def unreachable_state_codes(self):
+        """State codes not reachable from any input states."""
+        return self.analytics.garden_of_eden
 
     @property
     def unreachable_states(self):
         """System states that are not reachable from any input states."""
-        return sorted(set(self.in_states) - self.out_states)
+        return sorted(codes_to_hexstrs(self.unreachable_state_codes, self.spns))
+
+    def state_code(self, state):
+        """State code of STATE given as a code, statehexstr, or a sequence
+        with the state of each node.  ValueError if it is not a state of
+        this net.
+
+        >>> net = Net(edges=[(0,1),(1,2),(2,0)])
+        >>> net.state_code('011'), net.state_code(6), net.state_code([0,1,1])
+        (6, 6, 6)
+        >>> net.state_code(8)
+        Traceback (most recent call last):
+        ...
+        ValueError: State code 8 not in range(0, 8)
+        """
+        spns = self.spns
+        if isinstance(state, str):
+            return int(hexstrs_to_codes(state, spns)[0])
+        if np.ndim(state) == 0:
+            num = math.prod(spns.tolist())
+            if not 0 <= state < num:
+                raise ValueError(f'State code {state} not in range(0, {num})')
+            return int(state)
+        state = np.asarray(state)
+        if (state.shape != spns.shape
+            or not ((0 <= state) & (state < spns)).all()):
+            raise ValueError(f'State {state.tolist()} is not a state of '
+                             f'nodes with {spns.tolist()} states')
+        return int(encode_states(state[None,:], spns)[0])
         
 
     @property
@@ -292,20 +1264,25 @@ class Net():
     @property
     def nodes(self):
         """Return list of all nodes in ID order."""
-        return sorted(self.node_lut.values(), key=lambda n: n.id)
+        return self._store.nodes
+
+    @property
+    def node_lut(self):
+        """d[label] = Node"""
+        return dict(zip(self._store.labels, self._store.nodes))
 
     @property
     def node_labels(self):
-        return [n.label for n in self.node_lut.values()]
+        return list(self._store.labels)
 
     def __Xsuccessors(self, node_label):
         return list(self.graph.neighbors(node_label))
 
     def get_node(self, node_label):
-        return self.node_lut[node_label]
+        return self._store.node(self._store.position[node_label])
 
     def get_nodes(self, node_labels):
-        return [self.node_lut[label] for label in node_labels]
+        return [self.get_node(label) for label in node_labels]
     
     def __len__(self):
         return len(self.graph)
@@ -314,6 +1291,7 @@ class Net():
         """Return networkx DiGraph. Maybe write to PNG file."""
         G = nx.DiGraph(self.graph)
         if pngfile is not None:
+            from networkx.drawing.nx_pydot import write_dot
             dotfile = pngfile + ".dot"
             write_dot(G, dotfile)
             cmd = (f'dot -Tpng -o{pngfile} {dotfile} ')
@@ -324,6 +1302,7 @@ class Net():
 
 
     def draw(self):
+        from networkx.drawing.nx_pydot import pydot_layout
         nx.draw(self.graph,
                 pos=pydot_layout(self.graph),
                 # label='gnp_random_graph({N},{p})',
@@ -331,53 +1310,241 @@ class Net():
         return self
 
     def draw_states(self):
-        G = nx.DiGraph(sbn2sbs(self.tpm))
-        mapping = dict(zip(range(len(self.tpm.index)), self.tpm.index))
-        S = nx.relabel_nodes(G, mapping)
+        from networkx.drawing.nx_pydot import pydot_layout
+        S = self.state_graph
         nx.draw(S, pos=pydot_layout(S), with_labels=True )
             
     @property
     def pyphi_network(self):
-        """Return pyphi Network() instance."""
-        return pyphi.network.Network(self.tpm.to_numpy(),
-                                     cm=self.cm,
-                                     node_labels=self.node_labels)
+        """Return pyphi Network() instance. Cached until tpm is replaced or
+        the graph changes."""
+        return self._pyphi_cache()[0]
+
+    @property
+    def repertoires(self):
+        """RepertoireCache shared by phi() of every state of the cached
+        pyphi_network."""
+        return self._pyphi_cache()[1]
+
+    def _pyphi_cache(self):
+        key = (tuple(self.graph.edges), tuple(self.node_labels))
+        cached = getattr(self, '_pyphi', None)
+        tpm = self.tpm_array
+        if cached is None or cached[0] is not tpm or cached[1] != key:
+            import pyphi.network
+            with tr.span('pyphi_network'):
+                network = pyphi.network.Network(tpm.astype(np.float64),
+                                                cm=self.cm,
+                                                node_labels=self.node_labels)
+            cached = (tpm, key, network, RepertoireCache())
+            self._pyphi = cached
+        return cached[2:]
+
+    def clear_phi_caches(self):
+        """Free the pyphi_network and repertoires built for phi()."""
+        self._pyphi = None
 
     
-    def phi(self, statestr=None, verbose=False):
-        """Calculate phi for net."""
+    def phi(self, statestr=None, verbose=False, cache=None):
+        """Calculate phi for net.
+        statestr:: state code, statehexstr or sequence of node states.
+           Default is a random output state.
+        cache:: phial.cache.PhiCache to look up (and store) the result in."""
         if statestr is None:
-            instatestr = choice(self.tpm.index)
-            statestr = ''.join(f'{int(s):x}' for s in self.tpm.loc[instatestr,:])
-        #!print(f'DBG statestr={statestr}')
-        state = [int(c) for c in list(statestr)] 
+            statestr = choice(self.tpm_array)
+        code = self.state_code(statestr)
+        state = decode_states(code, self.spns)[0].tolist()
         if verbose:
             print(f'Calculating Φ at state={state}')
-        node_indices = tuple(range(len(self.graph)))
-        subsystem = pyphi.Subsystem(self.pyphi_network, state, node_indices)
-        return pyphi.compute.phi(subsystem)
+        if cache is None:
+            return network_phi(self.pyphi_network, state, self.repertoires)
+        key = pc.state_key(pc.net_key(self.tpm_array, self.cm), state)
+        phi = cache.get(key)
+        if phi is None:
+            phi = network_phi(self.pyphi_network, state, self.repertoires)
+            cache.put(key, phi)
+        return phi
 #END Net()
 
-def phi_all_states(net):
+def _label(label):
+    """Node label read back from JSON (where tuples become lists)."""
+    return tuple(label) if isinstance(label, list) else label
+
+def _lut_func(lut, input_states, name):
+    """Node func with truth table LUT (as from Net.func_lut) for inputs
+    with INPUT_STATES.  The func of that NAME from node_functions if it
+    gives the same table."""
+    lut = np.asarray(lut, dtype=int)
+    known = nf.funcLUT.get(re.sub('_func$', '', name))
+    inputs = state_matrix(input_states, backwards=False)
+    if (known is not None
+        and np.array_equal([known(sv) for sv in inputs.tolist()], lut)):
+        return known
+    if all(s == 2 for s in input_states):
+        return gf.BoolFunc.from_lut(lut, name=name)
+    table = dict(zip(map(tuple, inputs.tolist()), lut.tolist()))
+    def func(inputstates):
+        return table.get(tuple(inputstates), 0)
+    func.__name__ = name
+    return func
+
+def _npz_memmap(filename, name, mode='r'):
+    """Memory-map array NAME of uncompressed .npz file FILENAME."""
+    with zipfile.ZipFile(filename) as zf:
+        info = zf.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f'Array {name} of {filename} is compressed; '
+                         'load it without mmap_mode')
+    with open(filename, 'rb') as f:
+        # Member data follows the 30 byte local file header and its
+        # (variable length) name and extra fields.
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = struct.unpack('<HH', f.read(4))
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(filename, dtype=dtype, mode=mode, shape=shape,
+                     offset=offset, order='F' if fortran else 'C')
+
+class RepertoireCache():
+    """Repertoire irreducibility analyses (the MIP of a mechanism over a
+    purview: its repertoire, partitioned repertoire and their distance)
+    of one pyphi Network, shared across states.
+
+    pyphi caches repertoires per Subsystem; so per state and per cut.
+    But they only depend on the state of the mechanism (plus the cut and
+    the state of nodes outside the subsystem).  Keyed by those, any state
+    with the same mechanism state reuses them.  Most of the time of
+    pyphi.compute.phi is spent finding these.
+    Only shared within one process, so network_phi turns off pyphi's
+    parallel cut (and concept) evaluation while one is in use.
+    """
+    def __init__(self):
+        self.mips = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.mips)
+
+    def __reduce__(self):
+        # Don't ship the results to other processes (pyphi parallel cuts).
+        return (RepertoireCache, ())
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, entries=len(self))
+
+_SharedSubsystem = None
+
+def _shared_subsystem():
+    """The SharedSubsystem class.  Made on first use since it subclasses
+    pyphi.Subsystem; importing pyphi takes a good part of a second."""
+    global _SharedSubsystem
+    if _SharedSubsystem is not None:
+        return _SharedSubsystem
+    import pyphi
+
+    class SharedSubsystem(pyphi.Subsystem):
+        """pyphi Subsystem that keeps the MIPs it finds (and those of its
+        cut versions) in REPERTOIRES; a RepertoireCache shared across
+        states."""
+        def __init__(self, network, state, nodes=None, cut=None,
+                     mice_cache=None, repertoires=None):
+            super().__init__(network, state, nodes, cut=cut,
+                             mice_cache=mice_cache)
+            self.repertoires = repertoires
+            self._key = (self.node_indices, cut,
+                         tuple(self.state[i] for i in self.external_indices))
+
+        def find_mip(self, direction, mechanism, purview):
+            key = (self._key, direction, mechanism, purview,
+                   tuple(self.state[i] for i in mechanism))
+            mips = self.repertoires.mips
+            if key in mips:
+                self.repertoires.hits += 1
+                tr.count('mip_cache_hits')
+                return mips[key]
+            self.repertoires.misses += 1
+            tr.count('mip_cache_misses')
+            with tr.span('find_mip'):
+                mip = super().find_mip(direction, mechanism, purview)
+            mips[key] = mip
+            return mip
+
+        def apply_cut(self, cut):
+            tr.count('cuts')
+            return SharedSubsystem(self.network, self.state,
+                                   self.node_indices,
+                                   cut=cut, mice_cache=self._mice_cache,
+                                   repertoires=self.repertoires)
+
+    # Pickle (for pyphi parallel cuts) finds it via module __getattr__
+    SharedSubsystem.__qualname__ = 'SharedSubsystem'
+    _SharedSubsystem = SharedSubsystem
+    return SharedSubsystem
+
+def __getattr__(name):
+    # Module attributes made on first use.
+    if name == 'SharedSubsystem':
+        return _shared_subsystem()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def _is_dataframe(obj):
+    """True if OBJ is a pandas DataFrame. (Without importing pandas; if it
+    isn't imported there are no DataFrames.)"""
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(obj, pd.DataFrame)
+
+def network_phi(network, state, repertoires=None):
+    """Run pyphi.compute.phi on the whole of pyphi NETWORK in STATE.
+    state:: list with the state of each node
+    repertoires:: RepertoireCache to share work with other states of
+       NETWORK.  Cuts are then evaluated in this process (where the cache
+       is) whatever pyphi.config.PARALLEL_CUT_EVALUATION says."""
+    import pyphi
+    node_indices = tuple(range(network.size))
+    if repertoires is None:
+        with tr.span('subsystem'):
+            subsystem = pyphi.Subsystem(network, state, node_indices)
+        with tr.span('compute.phi'):
+            return pyphi.compute.phi(subsystem)
+    with tr.span('subsystem'):
+        subsystem = _shared_subsystem()(network, state, node_indices,
+                                        repertoires=repertoires)
+    with pyphi.config.override(PARALLEL_CUT_EVALUATION=False,
+                               PARALLEL_CONCEPT_EVALUATION=False):
+        with tr.span('compute.phi'):
+            return pyphi.compute.phi(subsystem)
+
+def iter_phi(net, states=None):
+    """Run pyphi.compute.phi over STATES (default: all reachable states) in
+    net one at a time.
+    GENERATES: (statestr, phi, elapsed_seconds) as each is calculated."""
+    if states is None:
+        states = codes_to_hexstrs(net.out_state_codes, net.spns)
+    network = net.pyphi_network
+    for statestr in states:
+        start = time.perf_counter()
+        with tr.span('state', state=statestr):
+            state = decode_states(net.state_code(statestr), net.spns)[0].tolist()
+            phi = network_phi(network, state, net.repertoires)
+        yield statestr, phi, time.perf_counter() - start
+
+def phi_all_states(net, verbose=True):
     """Run pyphi.compute.phi over all reachable states in net."""
     results = dict() # d[state] => phi
-    for statestr in net.out_states:
-        results[statestr] = net.phi(statestr)
-        print(f"Φ = {results[statestr]} using state={statestr}")
+    for statestr,phi,secs in iter_phi(net):
+        results[statestr] = phi
+        if verbose:
+            print(f"Φ = {results[statestr]} using state={statestr}")
     return results
 
 def pyphi_network_to_net(network):
-    """Load pyphi network into this instance (overwrite existing data)."""
-    labelLUT = dict(zip(network._node_indices, network._node_labels))
-    cm = network.cm
-    G = nx.DiGraph(cm)
-    tpm = to_2d(network.tpm) # sbn form
-    net = Net(G.edges)
-    allstates = list(itertools.product(*[n.states for n in net.nodes]))
-    for si,sv in enumerate(allstates):
-        s0 = ''.join(f'{s:x}' for s in sv)
-        for ni in range(len(net)):
-            node = net.nodes[ni]
-            net.tpm.loc[s0,node.label] = tpm[si][ni]
-    return net
+    """Net of pyphi network. See Net.from_pyphi()"""
+    return Net.from_pyphi(network)
 
@@ -0,0 +1,200 @@
+"""Where the time goes: named spans and counters.
+
+Code marks phases with span() and counts events with count().  Nothing
+is recorded (and almost nothing is spent) unless tracing is enabled:
+
+    import phial.trace as tr
+    with tr.tracing() as tracer:
+        exp.run()
+    tracer.summary()                       # time per span name
+    tracer.write_chrome_trace('run.json')  # open in chrome://tracing
+
+Spans used by phial:
+  experiment.run, calc_tpm, update_tpm (columns of changed nodes),
+  pyphi_network, canonical_form, analytics,
+  state (phi of one state), subsystem (pyphi.Subsystem construction),
+  compute.phi (pyphi.compute.phi; the MIP/cut search), find_mip
+  (repertoire MIPs not already in the RepertoireCache), simulate,
+  find_attractors (batches of states run without the TPM).
+Counters: mip_cache_hits, mip_cache_misses, cuts.
+
+Only this process is traced.  States calculated by worker processes
+appear as one state span each (with the time the worker reported).
+Cuts are always evaluated in the process calculating phi (see
+toolbox.network_phi) so find_mip and the counters see all of them.
+"""
+# Python standard library
+from collections import Counter
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+
+class _NullSpan():
+    """What span() returns when tracing is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+_tracer = None # the enabled Tracer
+
+
+def max_rss_kb():
+    """Peak resident set size of this process so far (KiB) or None.  A
+    high-water mark over the life of the process; not the memory of any
+    one span."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _Span():
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start,
+                        time.perf_counter() - self.start, **self.args)
+        return False
+
+
+class Tracer():
+    """Spans and counters recorded while enabled.
+    InstanceVars: events, counters
+    Each event is dict(name, start, seconds, pid, tid, process_max_rss_kb,
+    args) with start in seconds since the Tracer was made.
+    process_max_rss_kb is the peak memory of this process so far (when the
+    span ended); see max_rss_kb().  State spans of worker processes have
+    the worker's (in args) as worker_max_rss_kb.
+
+    >>> with tracing() as tracer:
+    ...     with span('outer', size=3):
+    ...         count('things', 2)
+    >>> tracer.summary()['outer']['count'], tracer.counters['things']
+    (1, 2)
+    >>> span('ignored') is _NULL_SPAN
+    True
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.counters = Counter()
+
+    def span(self, name, **args):
+        return _Span(self, name, args)
+
+    def add(self, name, start, seconds, **args):
+        """Record span NAME that started at START (time.perf_counter())."""
+        self.events.append(dict(name=name,
+                                start=start - self.origin,
+                                seconds=seconds,
+                                pid=os.getpid(),
+                                tid=threading.get_ident(),
+                                process_max_rss_kb=max_rss_kb(),
+                                args=args))
+
+    def count(self, name, num=1):
+        self.counters[name] += num
+
+    def summary(self):
+        """RETURN: d[spanName] = dict(count, total_seconds, mean_seconds,
+        max_seconds)"""
+        summ = dict()
+        for ev in self.events:
+            s = summ.setdefault(ev['name'], dict(count=0, total_seconds=0.0,
+                                                 max_seconds=0.0))
+            s['count'] += 1
+            s['total_seconds'] += ev['seconds']
+            s['max_seconds'] = max(s['max_seconds'], ev['seconds'])
+        for s in summ.values():
+            s['mean_seconds'] = s['total_seconds'] / s['count']
+        return summ
+
+    def to_dict(self):
+        return dict(events=self.events,
+                    counters=dict(self.counters),
+                    summary=self.summary())
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, default=str)
+
+    def chrome_trace(self):
+        """RETURN: dict in Chrome trace event format (chrome://tracing,
+        Perfetto).  Times are in microseconds."""
+        events = [dict(name=ev['name'], ph='X',
+                       ts=ev['start'] * 1e6, dur=ev['seconds'] * 1e6,
+                       pid=ev['pid'], tid=ev['tid'],
+                       args=dict(ev['args'],
+                                 process_max_rss_kb=ev['process_max_rss_kb']))
+                  for ev in self.events]
+        end = max((ev['start'] + ev['seconds'] for ev in self.events),
+                  default=0.0)
+        events.extend(dict(name=name, ph='C', ts=end * 1e6, pid=os.getpid(),
+                           args={name: value})
+                      for name,value in self.counters.items())
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+
+def enable(tracer=None):
+    """Start recording into TRACER (default: a new one). RETURN: it"""
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer()
+    return _tracer
+
+def disable():
+    """Stop recording. RETURN: the Tracer that was enabled (or None)"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+def enabled():
+    return _tracer is not None
+
+def current():
+    """The enabled Tracer (or None)"""
+    return _tracer
+
+@contextmanager
+def tracing(tracer=None):
+    """Enable tracing for the with block. Yields the Tracer."""
+    previous = _tracer
+    tracer = enable(tracer)
+    try:
+        yield tracer
+    finally:
+        enable(previous) if previous is not None else disable()
+
+def span(name, **args):
+    """Context manager timing the with block as span NAME (when enabled)."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, **args)
+
+def add(name, start, seconds, **args):
+    """Record a span timed elsewhere (when enabled)."""
+    if _tracer is not None:
+        _tracer.add(name, start, seconds, **args)
+
+def count(name, num=1):
+    if _tracer is not None:
+        _tracer.counters[name] += num
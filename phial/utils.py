@@ -1,4 +1,5 @@
 import time
+import os
 
 def tic():
     tic.start = time.perf_counter()
@@ -20,4 +21,13 @@ class Timer():
     def toc(self):
         elapsed_seconds = time.perf_counter() - self.start
         return elapsed_seconds # fractional
-    
+
+
+def drop_partial_line(path):
+    """Remove the last line of text file at PATH if it was not finished
+    (no newline); as left by a killed process that was appending to it."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        f.truncate(data.rfind(b'\n') + 1)
@@ -0,0 +1,29 @@
+# Python library
+# External packages
+import numpy as np
+import pytest
+# Local packages
+import phial.analytics as an
+import phial.toolbox as tb
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('bijective', [False, True])
+def test_chunked_matches_functional_graph(seed, bijective):
+    rng = np.random.default_rng(seed)
+    spns = [2, 3, 2, 5]
+    num = int(np.prod(spns))
+    succ = rng.permutation(num) if bijective else rng.integers(num, size=num)
+    fg = an.FunctionalGraph(succ)
+    csg = an.ChunkedStateGraph(tb.decode_states(succ, spns), spns,
+                               chunk_size=7)
+    on = fg.on_cycle
+    assert (csg.on_cycle == on).all()
+    assert (csg.cycle_attractor[on] == fg.attractor[on]).all()
+    assert (csg.cycle_attractor[~on] == -1).all()
+    assert csg.num_attractors == fg.num_attractors
+    assert csg.cycle_lengths.tolist() == fg.cycle_lengths.tolist()
+    sample = csg.sample(50, seed=seed)
+    assert (sample['attractor'] == fg.attractor[sample['code']]).all()
+    assert (sample['depth'] == fg.depth[sample['code']]).all()
+    assert csg.cycles == fg.cycles
@@ -0,0 +1,73 @@
+# Python library
+# External packages
+import pytest
+# Local packages
+import phial.cache as pc
+import phial.experiment as ex
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+
+def or_net():
+    return tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)], func=nf.OR_func)
+
+@pytest.fixture
+def cache(tmp_path):
+    c = pc.PhiCache(tmp_path)
+    yield c
+    c.close()
+
+def test_net_phi_cached(cache):
+    net = or_net()
+    uncached = net.phi('101')
+    assert uncached == pytest.approx(0.159722)
+    assert net.phi('101', cache=cache) == uncached
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+    assert or_net().phi('101', cache=cache) == uncached
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+def test_experiment_cached(cache, tmp_path):
+    first = ex.Experiment(None, net=or_net(), cache=cache)
+    first.run()
+    assert cache.stats['misses'] == 5
+    assert cache.stats['hits'] == 0
+    assert cache.stats['entries'] == 5
+    assert cache.stats['path'] == str(tmp_path / pc.PhiCache.filename)
+    # A new cache object on the same file sees the stored results.
+    again = pc.PhiCache(tmp_path)
+    second = ex.Experiment(None, net=or_net(), cache=again)
+    second.run()
+    assert (again.hits, again.misses) == (5, 0)
+    assert all(r.get('cached') for r in second.results.values())
+    assert (dict((s,r['phi']) for s,r in second.results.items())
+            == dict((s,r['phi']) for s,r in first.results.items()))
+    assert second.info()['cache']['hits'] == 5
+    again.close()
+
+def test_stats_after_clear(cache):
+    cache.put('a', 0.5)
+    assert cache.get('a') == 0.5
+    assert cache.get('b') is None
+    cache.clear()
+    stats = cache.stats
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 0)
+    assert cache.get('a') is None
+
+def test_lru_eviction(tmp_path):
+    cache = pc.PhiCache(tmp_path, max_bytes=64*1024)
+    key = lambda i: f'{i:06d}' + 'x'*60
+    for i in range(100):
+        cache.put(key(i), i)
+    assert cache.get(key(0)) == 0   # now the most recently used
+    i = 100
+    while True:
+        num = len(cache)
+        cache.put(key(i), i)
+        i += 1
+        if len(cache) <= num:
+            break
+    assert cache.size <= cache.max_bytes
+    assert cache.get(key(0)) == 0
+    assert cache.get(key(1)) is None
+    assert cache.get(key(i-1)) == i-1
+    cache.close()
@@ -0,0 +1,78 @@
+# Python library
+import json
+# External packages
+import pytest
+# Local packages
+import phial.experiment as ex
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+EXPECTED = {'000': 0.375, '010': 0.340278, '101': 0.159722,
+            '110': 0.125, '111': 0.125}
+
+def or_exp(func=nf.OR_func):
+    return ex.Experiment(None, net=tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)],
+                                          func=func))
+
+def phis(exp):
+    return dict((s,r['phi']) for s,r in exp.results.items())
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_checkpoint_written(tmp_path):
+    path = tmp_path / 'ckpt.jsonl'
+    exp = or_exp()
+    exp.run(checkpoint=str(path))
+    header, *rows = read_lines(path)
+    assert 'net' in header
+    assert len(rows) == 5
+    assert dict((r['state'],r['phi']) for r in rows) == pytest.approx(EXPECTED)
+
+def test_resume(tmp_path):
+    path = tmp_path / 'ckpt.jsonl'
+    first = or_exp()
+    first.run(checkpoint=str(path), stop_when=lambda s,phi,secs: True)
+    assert first.stopped is not None
+    assert len(read_lines(path)) == 1 + 1
+    # Simulate a kill in the middle of writing the next result.
+    with open(path, 'a') as f:
+        f.write('{"state": "1')
+    second = or_exp()
+    calculated = [s for s,phi,secs in second.iter_run(resume=str(path))]
+    assert second.stopped is None
+    assert len(calculated) == 5
+    assert phis(second) == pytest.approx(EXPECTED)
+    header, *rows = read_lines(path)
+    assert len(rows) == 5
+    assert len(set(r['state'] for r in rows)) == 5
+    # Resuming a finished run calculates nothing more.
+    third = or_exp()
+    third.run(resume=str(path))
+    assert phis(third) == phis(second)
+    assert len(read_lines(path)) == 1 + 5
+
+def test_resume_other_file(tmp_path):
+    old = tmp_path / 'old.jsonl'
+    new = tmp_path / 'new.jsonl'
+    or_exp().run(checkpoint=str(old), stop_when=lambda s,phi,secs: True)
+    exp = or_exp()
+    exp.run(checkpoint=str(new), resume=str(old))
+    assert len(read_lines(old)) == 1 + 1
+    assert len(read_lines(new)) == 1 + 4
+    assert phis(exp) == pytest.approx(EXPECTED)
+
+def test_resume_missing_file(tmp_path):
+    path = tmp_path / 'missing.jsonl'
+    exp = or_exp()
+    exp.run(resume=str(path))
+    assert phis(exp) == pytest.approx(EXPECTED)
+    assert len(read_lines(path)) == 1 + 5
+
+def test_resume_different_net(tmp_path):
+    path = tmp_path / 'ckpt.jsonl'
+    or_exp().run(checkpoint=str(path))
+    with pytest.raises(ValueError, match='not for this net'):
+        or_exp(func=nf.AND_func).run(resume=str(path))
+    assert len(read_lines(path)) == 1 + 5
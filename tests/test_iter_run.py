@@ -0,0 +1,103 @@
+# Python library
+import asyncio
+# External packages
+import pytest
+# Local packages
+import phial.cache as pc
+import phial.experiment as ex
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+EXPECTED = {'000': 0.375, '010': 0.340278, '101': 0.159722,
+            '110': 0.125, '111': 0.125}
+
+def or_exp():
+    return ex.Experiment(None, net=tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)],
+                                          func=nf.OR_func))
+
+def test_all_states():
+    exp = or_exp()
+    progress = []
+    got = dict((s,phi) for s,phi,secs in
+               exp.iter_run(progress=lambda *args: progress.append(args)))
+    assert exp.stopped is None
+    assert got == pytest.approx(EXPECTED)
+    assert [p[:2] for p in progress] == [(i,5) for i in range(1,6)]
+
+def test_stop():
+    exp = or_exp()
+    def progress(num_done, num_states, s, phi, secs):
+        if num_done == 2:
+            exp.stop()
+    got = list(exp.iter_run(progress=progress))
+    assert len(got) == 2
+    assert exp.stopped == 'stop() called'
+    assert len(exp.results) == 2
+    # A later run is not stopped by the earlier stop()
+    assert len(list(exp.iter_run())) == 5
+    assert exp.stopped is None
+
+def test_stop_when():
+    exp = or_exp()
+    got = list(exp.iter_run(stop_when=lambda s,phi,secs: s == '010'))
+    assert [s for s,phi,secs in got] == ['000', '010']
+    assert exp.stopped == 'stop_when(010)'
+
+def test_phi_above():
+    exp = or_exp()
+    got = list(exp.iter_run(phi_above=0.3))
+    assert len(got) == 1
+    assert got[0][1] == pytest.approx(0.375)
+    assert exp.stopped == 'phi > 0.3 in state 000'
+
+def test_timeout():
+    exp = or_exp()
+    assert list(exp.iter_run(timeout=0)) == []
+    assert exp.stopped == 'timeout after 0 seconds'
+    assert exp.results == {}
+
+def test_timeout_workers():
+    exp = or_exp()
+    got = list(exp.iter_run(workers=2, timeout=0))
+    assert len(got) < 5
+    assert exp.stopped == 'timeout after 0 seconds'
+
+def test_cancel():
+    exp = or_exp()
+    gen = exp.iter_run()
+    s, phi, secs = next(gen)
+    assert (s, phi) == ('000', pytest.approx(0.375))
+    gen.close()
+    assert exp.stopped == 'cancelled'
+    assert list(exp.results) == ['000']
+    assert exp.net._pyphi is None # repertoires freed
+
+def test_aiter_run():
+    async def collect(exp, stop_after):
+        got = []
+        async for s,phi,secs in exp.aiter_run():
+            got.append((s,phi))
+            if len(got) == stop_after:
+                break
+        return got
+    exp = or_exp()
+    got = asyncio.run(collect(exp, 5))
+    assert dict(got) == pytest.approx(EXPECTED)
+    exp = or_exp()
+    assert len(asyncio.run(collect(exp, 2))) == 2
+    assert exp.stopped == 'cancelled'
+    assert len(exp.results) == 2
+
+def test_aiter_run_cache(tmp_path):
+    async def collect(exp):
+        return dict([(s,phi) async for s,phi,secs in exp.aiter_run()])
+    cache = pc.PhiCache(tmp_path)
+    exp = or_exp()
+    exp.cache = cache
+    assert asyncio.run(collect(exp)) == pytest.approx(EXPECTED)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 5, 5)
+    exp = or_exp()
+    exp.cache = cache
+    assert asyncio.run(collect(exp)) == pytest.approx(EXPECTED)
+    assert cache.hits == 5
+    cache.close()
@@ -0,0 +1,43 @@
+# Python library
+# External packages
+import pytest
+# Local packages
+import phial.experiment as ex
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+
+def nets():
+    edges = [(0,1),(1,2),(2,0),(1,0),(2,1)]
+    return [tb.Net(edges=edges, func=nf.OR_func),
+            tb.Net(edges=edges, func=nf.XOR_func),
+            tb.Net(edges=[('A','B'),('B','A')], func=nf.AND_func)]
+
+def all_jobs(nets):
+    jobs = []
+    for i,net in enumerate(nets):
+        codes = net.out_state_codes
+        jobs.extend(((i,code),i,state) for code,state in
+                    zip(codes.tolist(),
+                        tb.decode_states(codes, net.spns).tolist()))
+    return jobs
+
+def test_calculate_jobs_parallel_matches_serial():
+    jobs = all_jobs(nets())
+    serial = dict((key,phi) for key,phi,secs,cpu in
+                  ex.calculate_jobs(nets(), jobs))
+    parallel = dict((key,phi) for key,phi,secs,cpu in
+                    ex.calculate_jobs(nets(), jobs, workers=2))
+    assert len(serial) == len(jobs)
+    assert parallel == pytest.approx(serial)
+    assert serial[(0,0)] == pytest.approx(0.375)
+
+def test_run_workers():
+    serial = ex.Experiment(None, net=nets()[0])
+    serial.run()
+    parallel = ex.Experiment(None, net=nets()[0])
+    parallel.run(workers=2)
+    # Kept in state order whatever order the workers finished in.
+    assert list(parallel.results) == list(serial.results)
+    assert (dict((s,r['phi']) for s,r in parallel.results.items())
+            == pytest.approx(dict((s,r['phi']) for s,r in serial.results.items())))
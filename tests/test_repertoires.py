@@ -0,0 +1,31 @@
+# Python library
+# External packages
+import pyphi
+import pytest
+# Local packages
+import phial.toolbox as tb
+import phial.node_functions as nf
+import phial.trace as tr
+
+
+def or_net():
+    return tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)], func=nf.OR_func)
+
+def test_cache_used_with_parallel_cuts():
+    net = or_net()
+    with pyphi.config.override(PARALLEL_CUT_EVALUATION=True):
+        with tr.tracing() as tracer:
+            phis = dict((s, net.phi(s)) for s in sorted(net.out_states))
+        assert pyphi.config.PARALLEL_CUT_EVALUATION
+    stats = net.repertoires.stats
+    assert stats['hits'] > 0
+    assert stats['misses'] > 0
+    assert tracer.counters['mip_cache_hits'] == stats['hits']
+    assert tracer.counters['cuts'] > 0
+    # Same phi as plain pyphi (no shared cache)
+    for s,phi in phis.items():
+        state = tb.decode_states(net.state_code(s), net.spns)[0].tolist()
+        assert phi == pytest.approx(tb.network_phi(net.pyphi_network, state))
+    assert phis == pytest.approx({'000': 0.375, '010': 0.340278,
+                                  '101': 0.159722, '110': 0.125,
+                                  '111': 0.125})
@@ -0,0 +1,36 @@
+# Python library
+# External packages
+import numpy as np
+import pytest
+# Local packages
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+
+@pytest.fixture
+def net():
+    return tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)], func=nf.OR_func)
+
+def test_state_forms_agree(net):
+    assert net.state_code('101') == net.state_code(5) == net.state_code([1,0,1])
+    assert net.phi('101') == net.phi(5) == pytest.approx(0.159722)
+
+@pytest.mark.parametrize('state', ['1111', '01', '', '012', '0g0', '0 1'])
+def test_bad_statehexstr(net, state):
+    with pytest.raises(ValueError):
+        net.phi(state)
+
+@pytest.mark.parametrize('state', [99, 8, -1])
+def test_bad_state_code(net, state):
+    with pytest.raises(ValueError):
+        net.phi(state)
+
+@pytest.mark.parametrize('state', [[1,1,1,1], [0,1], [0,1,2], [0,-1,0]])
+def test_bad_state_sequence(net, state):
+    with pytest.raises(ValueError):
+        net.phi(state)
+
+def test_hexstrs_to_codes_nonbinary():
+    assert tb.hexstrs_to_codes(['02', '1A'], [2,16]).tolist() == [0+2*2, 1+10*2]
+    with pytest.raises(ValueError):
+        tb.hexstrs_to_codes(['03'], [2,3])
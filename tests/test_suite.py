@@ -0,0 +1,101 @@
+# Python library
+import csv
+import json
+import sys
+# External packages
+import pytest
+# Local packages
+import phial.cache as pc
+import phial.experiment as ex
+
+NETS = [
+    dict(title='or', edges=[['A','B'],['B','C'],['C','A'],['B','A'],['C','B']],
+         funcs={'A':'OR', 'B':'OR', 'C':'OR'}),
+    dict(title='and', edges=[['A','B'],['B','A']],
+         funcs={'A':'AND', 'B':'AND'}),
+]
+OR_PHI = {'000': 0.375, '010': 0.340278, '101': 0.159722,
+          '110': 0.125, '111': 0.125}
+
+def experiments(cache=None):
+    return [ex.experiment_from_json(jj, cache=cache) for jj in NETS]
+
+@pytest.fixture
+def suite_file(tmp_path):
+    path = tmp_path / 'suite.jsonl'
+    path.write_text(''.join(json.dumps(jj) + '\n' for jj in NETS))
+    return path
+
+def test_load_suite(suite_file, tmp_path):
+    defs = ex.load_suite(str(suite_file))
+    assert [name for name,jj in defs] == [f'{suite_file}:1', f'{suite_file}:2']
+    assert [jj for name,jj in defs] == NETS
+    for i,jj in enumerate(NETS):
+        (tmp_path / f'net{i}.json').write_text(json.dumps(jj))
+    assert ex.load_suite(str(tmp_path)) == [('net0.json', NETS[0]),
+                                            ('net1.json', NETS[1])]
+
+def test_run_suite_jsonl(tmp_path):
+    exps = experiments()
+    path = tmp_path / 'out.jsonl'
+    with open(path, 'w') as f:
+        summary = ex.run_suite(exps, outfile=f)
+    recs = [json.loads(line) for line in path.read_text().splitlines()]
+    num_states = sum(len(exp.net.out_state_codes) for exp in exps)
+    assert len(recs) == num_states == summary['num_states']
+    assert summary['num_nets'] == 2
+    assert summary['num_cached'] == 0
+    assert set(recs[0]) == {'net', 'state', 'phi', 'elapsed_seconds',
+                            'cpu_seconds'}
+    got = dict((r['state'],r['phi']) for r in recs if r['net'] == 'or')
+    assert got == pytest.approx(OR_PHI)
+    for exp in exps:
+        assert (dict((r['state'],r['phi']) for r in recs
+                     if r['net'] == exp.title)
+                == dict((s,r['phi']) for s,r in exp.results.items()))
+
+def test_run_suite_csv(tmp_path):
+    path = tmp_path / 'out.csv'
+    with open(path, 'w', newline='') as f:
+        ex.run_suite(experiments(), outfile=f, names=['a', 'b'])
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert dict((r['state'],float(r['phi'])) for r in rows
+                if r['net'] == 'a') == pytest.approx(OR_PHI)
+    assert set(r['net'] for r in rows) == {'a', 'b'}
+
+def test_run_suite_cache(tmp_path):
+    cache = pc.PhiCache(tmp_path)
+    first = ex.run_suite(experiments(cache=cache))
+    assert first['num_cached'] == 0
+    assert len(cache) == first['num_states']
+    exps = experiments(cache=cache)
+    second = ex.run_suite(exps)
+    assert second['num_cached'] == second['num_states'] == first['num_states']
+    assert (dict((s,r['phi']) for s,r in exps[0].results.items())
+            == pytest.approx(OR_PHI))
+    cache.close()
+
+def run_main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['experiment', *map(str, argv)])
+    ex.main()
+
+@pytest.mark.parametrize('opt', [['--checkpoint', 'x.jsonl'],
+                                 ['--resume', 'x.jsonl'],
+                                 ['--symmetry']])
+def test_main_suite_rejects_net_options(monkeypatch, suite_file, opt):
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, suite_file, *opt)
+
+def test_main_suite(monkeypatch, suite_file, tmp_path, capsys):
+    monkeypatch.setenv('PHIAL_CACHE_DIR', str(tmp_path / 'cache'))
+    out = tmp_path / 'out.jsonl'
+    trace = tmp_path / 'trace.json'
+    run_main(monkeypatch, suite_file, '--cache', '--outfile', out,
+             '--trace', trace)
+    assert 'Cached            0' in capsys.readouterr().out
+    assert len(out.read_text().splitlines()) == 5 + 4
+    events = json.loads(trace.read_text())['traceEvents']
+    assert sum(e['name'] == 'state' for e in events) == 5 + 4
+    run_main(monkeypatch, suite_file, '--cache')
+    assert 'Cached            9' in capsys.readouterr().out
@@ -0,0 +1,88 @@
+# Python library
+import json
+# External packages
+import pytest
+# Local packages
+import phial.experiment as ex
+import phial.sweep as sw
+import phial.toolbox as tb
+
+EDGES = [('A','B'),('B','A')]
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def state_phis(rec):
+    return dict(zip(rec['states'], rec['phi']))
+
+def test_assignment():
+    sweep = sw.Sweep(EDGES)
+    assert sweep.counts == [4, 4]
+    assert len(sweep) == 16
+    assert sweep.assignment(6) == {'A': 1, 'B': 2}
+    with pytest.raises(IndexError):
+        sweep.assignment(16)
+    assert sweep.indices(start=3, stop=9, step=2) == range(3, 9, 2)
+    assert sweep.indices(sample=4, seed=1) == sweep.indices(sample=4, seed=1)
+
+def test_net_phi():
+    sweep = sw.Sweep(EDGES)
+    net = sweep.net(6)
+    exp = ex.Experiment(EDGES)
+    exp.generate_truth()
+    exp.set_funcs({'A': 1, 'B': 2})
+    assert (net.tpm_array == exp.net.tpm_array).all()
+    assert (dict((c,net.phi(c)) for c in net.out_state_codes.tolist())
+            == dict((c,exp.net.phi(c))
+                    for c in exp.net.out_state_codes.tolist()))
+
+def test_net_ternary():
+    exp = ex.Experiment([('A','B'),('B','A'),('A','C'),('C','B')],
+                        states={'C': 3})
+    sweep = sw.Sweep(exp=exp)
+    net = sweep.net(5)
+    assert net.spns.tolist() == [2, 2, 3]
+    assert net.tpm_array.shape == (12, 3)
+    assert (net.tpm_array == exp.net.calc_tpm_array()).all()
+    assert net.graph.name == ' #5'
+
+def test_resume(tmp_path):
+    path = str(tmp_path / 'sweep.jsonl')
+    sweep = sw.Sweep(EDGES)
+    assert sweep.run(path, indices=range(0, 6), dedup=False) == 6
+    # Killed while writing a record.
+    with open(path, 'a') as f:
+        f.write('{"index": 6, "fu')
+    assert sweep.run(path, dedup=False) == 10
+    recs = read(path)
+    assert sorted(r['index'] for r in recs) == list(range(16))
+    assert sweep.run(path, dedup=False) == 0
+    assert len(read(path)) == 16
+    rec = next(r for r in recs if r['index'] == 6)
+    net = sweep.net(6)
+    assert rec['states'] == net.out_state_codes.tolist()
+    assert rec['phi'] == pytest.approx([net.phi(c) for c in rec['states']])
+    assert rec['max_phi'] == max(rec['phi'])
+
+def test_dedup(tmp_path):
+    full = str(tmp_path / 'full.jsonl')
+    dedup = str(tmp_path / 'dedup.jsonl')
+    sweep = sw.Sweep(EDGES)
+    sweep.run(full, dedup=False)
+    num = sweep.run(dedup)
+    expected = dict((r['index'],r) for r in read(full))
+    recs = dict((r['index'],r) for r in read(dedup))
+    same = [r for r in recs.values() if 'same_as' in r]
+    assert len(recs) == 16
+    assert num + len(same) == 16
+    assert len(same) == 6 # (f,g) is (g,f) with A and B swapped; f != g
+    for i,rec in recs.items():
+        assert rec['states'] == expected[i]['states']
+        assert rec['phi'] == pytest.approx(expected[i]['phi'])
+        if 'same_as' in rec:
+            assert rec['canon'] == recs[rec['same_as']]['canon']
+            assert rec['same_as'] < i
+    # Resuming keeps the classes found before.
+    sweep.run(dedup)
+    assert len(read(dedup)) == 16
@@ -0,0 +1,95 @@
+# Python library
+# External packages
+import numpy as np
+import pytest
+# Local packages
+import phial.toolbox as tb
+import phial.node_functions as nf
+
+
+EDGES = [(0,1),(1,0)]
+
+def test_tpm_from_funcs_accepted():
+    net = tb.Net(edges=EDGES, func=nf.XOR_func)
+    net2 = tb.Net(edges=EDGES, tpm=net.tpm_array)
+    assert (net2.tpm_array == net.tpm_array).all()
+    net3 = tb.Net(edges=EDGES, tpm=net.tpm.iloc[::-1])  # any row order
+    assert (net3.tpm_array == net.tpm_array).all()
+
+def test_probabilistic_tpm_accepted():
+    tpm = np.full((4,2), 0.5)
+    assert tb.Net(edges=EDGES, tpm=tpm).tpm_array.dtype == np.float64
+
+@pytest.mark.parametrize('shape', [(8,2), (2,2), (4,3), (4,)])
+def test_wrong_shape(shape):
+    with pytest.raises(ValueError):
+        tb.Net(edges=EDGES, tpm=np.zeros(shape))
+
+@pytest.mark.parametrize('value', [5, 2, -1, 1.5])
+def test_value_not_a_state(value):
+    tpm = np.zeros((4,2))
+    tpm[3,1] = value
+    with pytest.raises(ValueError):
+        tb.Net(edges=EDGES, tpm=tpm)
+
+def test_value_of_nonbinary_node():
+    net = tb.Net(edges=EDGES)
+    net.get_node('B').num_states = 3
+    tpm = np.zeros((6,2), dtype=int)
+    tpm[:,1] = 2
+    net.tpm = tpm
+    assert net.tpm_array[:,1].tolist() == [2]*6
+    tpm[0,0] = 2
+    with pytest.raises(ValueError):
+        net.tpm = tpm
+
+def test_dataframe_missing_row():
+    df = tb.Net(edges=EDGES).tpm
+    with pytest.raises(ValueError):
+        tb.Net(edges=EDGES, tpm=df.iloc[:3])
+
+def test_from_lex_state_by_state():
+    net = tb.Net(edges=[(0,1),(1,2),(2,0),(0,2)])
+    for node,func in zip(net.nodes, [nf.AND_func, nf.XOR_func, nf.OR_func]):
+        node.func = func
+    perm = tb.lex_permutation(net.spns)
+    sbs = np.eye(8)[net.successor_codes]
+    assert not np.array_equal(sbs[perm][:,perm], sbs[perm])
+    lex = tb.Net.from_tpm_array(sbs[perm][:,perm], cm=net.cm, order='lex')
+    assert lex.tpm_array.tolist() == net.tpm_array.tolist()
+    sbn = tb.Net.from_tpm_array(net.tpm_array[perm], cm=net.cm, order='lex')
+    assert sbn.tpm_array.tolist() == net.tpm_array.tolist()
+
+def test_dataframe_is_read_only():
+    net = tb.Net(edges=EDGES, func=nf.XOR_func)
+    succ = net.successor_codes.tolist()
+    df = net.tpm
+    with pytest.raises(ValueError):
+        df.loc['00'] = [1, 1]
+    df['A'] = 1 # replaces the column of this DataFrame only
+    assert net.tpm['A'].tolist() == [0, 0, 1, 1]
+    assert net.successor_codes.tolist() == succ
+    df = net.tpm.copy()
+    df.loc['00'] = [1, 1]
+    net.tpm = df
+    assert net.successor_codes.tolist() == [3] + succ[1:]
+
+def test_graph_edited_directly():
+    full = tb.Net(edges=EDGES + [(0,0)], func=nf.XOR_func)
+    net = tb.Net(edges=EDGES, func=nf.XOR_func)
+    net.graph.add_edge('A', 'A')
+    assert net.tpm_array.tolist() == full.tpm_array.tolist()
+    assert net.predecessor_indices(net.get_node('A')) == [0, 1]
+
+    net = tb.Net(edges=EDGES, func=nf.XOR_func)
+    old = net.tpm_array.tolist()
+    net.graph.add_edge('A', 'A')
+    assert net.calc_tpm_array().tolist() == full.tpm_array.tolist()
+    net = tb.Net(edges=EDGES, func=nf.XOR_func)
+    assert net.tpm_array.tolist() == old
+    net.graph.add_edge('A', 'A')
+    net.get_node('B').func = nf.XOR_func  # same func; nothing to update
+    assert net.tpm_array.tolist() == old
+    net.get_node('B').func = nf.OR_func
+    full.get_node('B').func = nf.OR_func
+    assert net.tpm_array.tolist() == full.tpm_array.tolist()
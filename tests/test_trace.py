@@ -0,0 +1,67 @@
+# Python library
+import json
+# External packages
+# Local packages
+import phial.experiment as ex
+import phial.toolbox as tb
+import phial.node_functions as nf
+import phial.trace as tr
+
+
+def or_exp():
+    return ex.Experiment(None, net=tb.Net(edges=[(0,1),(1,2),(2,0),(1,0),(2,1)],
+                                          func=nf.OR_func))
+
+def spans(trace, name):
+    return [ev for ev in trace['traceEvents']
+            if ev['ph'] == 'X' and ev['name'] == name]
+
+def test_not_enabled():
+    exp = or_exp()
+    exp.run()
+    assert not tr.enabled()
+    assert 'trace' not in exp.info()
+
+def test_chrome_trace(tmp_path):
+    exp = or_exp()
+    with tr.tracing() as tracer:
+        exp.run()
+        info = exp.info()
+    assert not tr.enabled()
+    path = tmp_path / 'trace.json'
+    tracer.write_chrome_trace(path)
+    trace = json.loads(path.read_text())
+    assert trace == json.loads(json.dumps(tracer.chrome_trace()))
+
+    run, = spans(trace, 'experiment.run')
+    states = spans(trace, 'state')
+    assert len(states) == 5
+    assert sorted(ev['args']['key'] for ev in states) == sorted(exp.results)
+    assert len(spans(trace, 'compute.phi')) == 5
+    assert len(spans(trace, 'calc_tpm')) == 1
+    for ev in states:
+        assert run['ts'] <= ev['ts']
+        assert ev['ts'] + ev['dur'] <= run['ts'] + run['dur']
+        # The state span is inside the time reported for the state.
+        assert 0 < ev['dur'] <= (
+            exp.results[ev['args']['key']]['elapsed_seconds'] * 1e6)
+    counters = dict((ev['name'], ev['args'][ev['name']])
+                    for ev in trace['traceEvents'] if ev['ph'] == 'C')
+    assert counters == dict(tracer.counters)
+    assert counters['cuts'] > 0
+    assert counters['mip_cache_hits'] > 0
+    assert info['trace']['spans']['state']['count'] == 5
+    assert info['trace']['counters'] == counters
+
+def test_worker_states():
+    exp = or_exp()
+    with tr.tracing() as tracer:
+        exp.run(workers=2)
+    trace = tracer.chrome_trace()
+    states = spans(trace, 'state')
+    assert len(states) == 5
+    assert all(ev['args']['worker'] for ev in states)
+    assert all(ev['args']['cpu_seconds'] >= 0 for ev in states)
+    # Memory of the worker that calculated the state, not of this process
+    assert all(ev['args']['worker_max_rss_kb'] > 0 for ev in states)
+    assert all('process_max_rss_kb' in ev['args'] for ev in states)